@@ -0,0 +1,229 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import folium
+import numpy as np
+
+# The benchmarks run against the everland package of this checkout.
+repoFolder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repoFolder)
+
+from everland import cache, config, elevation, livable, maps, stats, sweep, temperature
+import mockServer
+import syntheticData
+
+
+
+# File, which gets one JSON line per benchmark run appended.
+resultsFile = os.path.join(repoFolder, 'benchmarks', 'results.jsonl')
+
+
+
+# Points all apis of Everland to the mock server and all of its files into the given folder.
+def configureEverland(pUrl, pFolder, pTemperatureFile):
+    config.archiveApi = f"{pUrl}/v1/archive"
+    config.climateApi = f"{pUrl}/v1/climate"
+    config.meteoElevationApi = f"{pUrl}/v1/elevation"
+    config.geocodingApi = f"{pUrl}/v1/search"
+    config.openElevationApi = f"{pUrl}/api/v1/lookup"
+    config.localElevationApi = f"{pUrl}/v1/test-dataset"
+    elevation.localElevation = elevation.LocalElevationProvider()
+
+    # No DEM tiles, so the elevations come from the (mocked) local api.
+    config.demFolder = os.path.join(pFolder, 'dem')
+    elevation.demTiles = None
+    elevation.elevationProvider = None
+
+    config.temperatureDataFile = pTemperatureFile
+    config.climateMetricsFile = os.path.join(pFolder, 'climateMetrics.csv')
+    config.runSummaryFile = None
+    # The http cache of the Open-Meteo client would hide the requests of the warm runs (every thread has its own session, so expire at once).
+    config.httpCacheFile = os.path.join(pFolder, 'http-cache')
+    config.httpCacheExpiry = 0
+
+    # The maps must not open a browser.
+    folium.Map.show_in_browser = lambda self: None
+
+    os.makedirs(os.path.join(pFolder, 'geojson'), exist_ok=True)
+    os.makedirs(os.path.join(pFolder, 'html'), exist_ok=True)
+    os.chdir(pFolder)
+
+
+
+# Starts with an empty result cache (and no loaded temperature grid), so the next run is a cold one.
+def resetCaches(pName):
+    config.resultCacheFile = os.path.abspath(f"results-{pName}.sqlite")
+    # Reopen the cache connection with the new file.
+    cache.resultCacheLocal.pid = None
+    temperature.temperatureGrid = None
+
+    if os.path.exists(config.climateMetricsFile):
+        os.remove(config.climateMetricsFile)
+
+
+
+# Removes the results store and the checkpoint of a sweep, so it doesn't continue a previous one.
+def resetSweep(pSteps):
+    for name in os.listdir('geojson'):
+        if name.startswith(f"bruteforcedCordinate_SeaAndTemp_Scale{pSteps}."):
+            os.remove(os.path.join('geojson', name))
+
+
+
+# Runs a function and returns its duration, the stages and counters it recorded and the requests the mock server got.
+def measure(pName, pFunction, *pArgs):
+    requestsBefore = dict(mockServer.requestCounts)
+    stats.startRunStats(pName)
+
+    start = time.perf_counter()
+    # The functions print a lot, which would only slow them down here.
+    with contextlib.redirect_stdout(io.StringIO()):
+        pFunction(*pArgs)
+    seconds = time.perf_counter() - start
+
+    runStats = stats.getRunStats()
+    return {
+        'seconds': round(seconds, 4),
+        'requests': {endpoint: count - requestsBefore.get(endpoint, 0) for endpoint, count in mockServer.requestCounts.items() if count != requestsBefore.get(endpoint, 0)},
+        'stages': {name: round(stage['seconds'], 4) for name, stage in runStats['stages'].items()},
+        'counters': runStats['counters']
+    }
+
+
+
+# Times a function with empty caches ('cold') and a second time with the caches of the first run ('warm').
+def measureColdAndWarm(pName, pSize, pFunction, *pArgs, pBefore=None):
+    results = []
+    resetCaches(f"{pName}{pSize}")
+
+    for phase in ['cold', 'warm']:
+        if pBefore is not None:
+            pBefore()
+        results.append(dict({'benchmark': pName, 'size': pSize, 'phase': phase}, **measure(pName, pFunction, *pArgs)))
+        print(f"{pName:<12} {pSize:>8} {phase:<5} {results[-1]['seconds']:>10.3f}s")
+
+    return results
+
+
+
+def benchmarkSweep(pSteps, pWorkers):
+    return measureColdAndWarm('sweep', pSteps, sweep.bruteforceCoordiantesToFile, 90, 180, pSteps, None, pWorkers, pBefore=lambda: resetSweep(pSteps))
+
+
+
+def benchmarkCities(pCount):
+    return measureColdAndWarm('cities', pCount, livable.checkCityForLivable, syntheticData.createCities(pCount))
+
+
+
+# Plots the results of the sweep with the same scale, so the sweep must have run before.
+def benchmarkPlot(pSteps, pMode):
+    return [dict({'benchmark': f"plot-{pMode}", 'size': pSteps, 'phase': 'cold'}, **measure('plot', maps.plotDataFromFile, f"./geojson/bruteforcedCordinate_SeaAndTemp_Scale{pSteps}.npz", pMode))]
+
+
+
+def benchmarkTemperature(pCount):
+    rng = np.random.default_rng(pCount)
+    lats = rng.uniform(-90, 90, pCount)
+    longs = rng.uniform(-180, 180, pCount)
+
+    # One call per location, like the callers of 'get_temperature_data' do.
+    def run():
+        for lat, lon in zip(lats, longs):
+            temperature.get_temperature_data(lon, lat)
+
+    return measureColdAndWarm('temperature', pCount, run)
+
+
+
+# Returns the current commit of the checkout (with a '+' if there are uncommitted changes), to track the results across commits.
+def getCommit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repoFolder, capture_output=True, text=True, check=True).stdout.strip()
+        changed = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repoFolder, capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('+' if changed else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+
+# Prints the speedup (or slowdown) compared to the last run of another commit with the same benchmarks.
+def compareWithPrevious(pRun, pFile):
+    if not os.path.exists(pFile):
+        return
+
+    with open(pFile, 'r') as f:
+        previous = [json.loads(line) for line in f if line.strip()]
+    previous = [run for run in previous if run['commit'] != pRun['commit']]
+    if len(previous) == 0:
+        return
+
+    before = {(result['benchmark'], result['size'], result['phase']): result['seconds'] for result in previous[-1]['results']}
+    print(f"\nCompared with {previous[-1]['commit']}:")
+    for result in pRun['results']:
+        key = (result['benchmark'], result['size'], result['phase'])
+        if key in before and result['seconds'] > 0:
+            print(f"{key[0]:<12} {key[1]:>8} {key[2]:<5} {before[key] / result['seconds']:>9.2f}x")
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the sweep, the city check, the maps and the temperature lookup against a local mock server.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[30, 15, 10], help="step sizes of the sweeps (and maps) in degrees")
+    parser.add_argument('--cities', type=int, nargs='+', default=[10, 100], help="numbers of cities to check")
+    parser.add_argument('--points', type=int, nargs='+', default=[100, 1000], help="numbers of single temperature lookups")
+    parser.add_argument('--latency', type=float, default=0.02, help="delay of every mock request in seconds")
+    parser.add_argument('--batch-limit', type=int, default=100, help="maximum number of locations per elevation request")
+    parser.add_argument('--resolution', type=float, default=2.5, help="grid resolution of the synthetic NetCDF file in degrees")
+    parser.add_argument('--workers', type=int, default=1, help="processes of the sweep")
+    parser.add_argument('--folder', default=None, help="working folder (default: a temporary folder)")
+    parser.add_argument('--output', default=resultsFile, help="file the results get appended to")
+    args = parser.parse_args()
+
+    folder = args.folder if args.folder is not None else tempfile.mkdtemp(prefix='everland-benchmark-')
+    os.makedirs(folder, exist_ok=True)
+    temperatureFile = os.path.join(folder, f"data-temps-{args.resolution}.nc")
+    if not os.path.exists(temperatureFile):
+        syntheticData.writeTemperatureData(temperatureFile, args.resolution)
+
+    server, url = mockServer.startMockServer(args.latency, {'opentopodata': args.batch_limit, 'elevation': args.batch_limit})
+    configureEverland(url, folder, temperatureFile)
+    config.localElevationBatchSize = args.batch_limit
+    elevation.localElevation = elevation.LocalElevationProvider()
+
+    print(f"Working folder: {folder}, mock server: {url}, latency: {args.latency}s")
+    results = []
+    for steps in args.scales:
+        results += benchmarkSweep(steps, args.workers)
+        results += benchmarkPlot(steps, 'image')
+        results += benchmarkPlot(steps, 'geojson')
+        results += benchmarkPlot(steps, 'tiles')
+    for count in args.cities:
+        results += benchmarkCities(count)
+    for count in args.points:
+        results += benchmarkTemperature(count)
+    server.shutdown()
+
+    run = {
+        'commit': getCommit(),
+        'started': time.time(),
+        'python': platform.python_version(),
+        'settings': vars(args),
+        'results': results
+    }
+    compareWithPrevious(run, args.output)
+
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(run) + "\n")
+
+
+
+if __name__ == '__main__':
+    main()
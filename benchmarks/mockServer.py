@@ -0,0 +1,195 @@
+import datetime
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+import zlib
+import flatbuffers
+import numpy as np
+from openmeteo_sdk.Model import Model
+
+
+
+# Seconds every request gets delayed, to simulate the network and the server.
+latency = 0.0
+# Maximum number of locations per request, like the limits of the real apis. Larger requests get a 400 response.
+batchLimits = {'opentopodata': 100, 'elevation': 100, 'open-elevation': 1000, 'archive': 1000, 'climate': 1000}
+# Number of requests per endpoint since the start of the server.
+requestCounts = {}
+requestCountsLock = threading.Lock()
+
+
+
+# Deterministic terrain: mountains and oceans, so there is a mix of flooded, dry and unknown cells. Oceans are 0m.
+def getElevations(pLats, pLongs):
+    lats = np.asarray(pLats, dtype=float)
+    longs = np.asarray(pLongs, dtype=float)
+    elevation = 1500 * np.sin(np.radians(lats) * 3) * np.cos(np.radians(longs) * 2) + 200 * np.sin(np.radians(longs) * 7)
+    return np.maximum(elevation, 0.0).round(1)
+
+
+
+# Deterministic daily climate values (max temperature, precipitation, max wind speed) of a location for the requested days.
+# The future gets a bit warmer, wetter and windier, depending on the location, so some locations fail the checks.
+# Every model of an ensemble gets its own values.
+def getDailyClimate(pLat, pLong, pVariables, pDays, pFuture, pModel=None):
+    day = np.arange(pDays)
+    seed = zlib.crc32(f"{pLat:.4f},{pLong:.4f},{pFuture}{'' if pModel is None else pModel}".encode())
+    noise = np.random.default_rng(seed).standard_normal((len(pVariables), pDays))
+    change = 1 + (0.3 * abs(np.sin(np.radians(pLat * 5 + pLong))) if pFuture else 0)
+    if pModel is not None:
+        change = 1 + (change - 1) * (0.5 + zlib.crc32(pModel.encode()) % 100 / 100)
+
+    values = []
+    for variable, variableNoise in zip(pVariables, noise):
+        if variable.startswith('temperature'):
+            value = (30 - abs(pLat) / 3 + 8 * np.sin(2 * np.pi * day / 365.25)) * change + 2 * variableNoise
+        elif variable.startswith('precipitation'):
+            value = np.maximum(0, 5 * variableNoise + 2) * change
+        else:
+            value = (15 + 5 * abs(variableNoise)) * change
+        values.append(value.astype(np.float32))
+
+    return values
+
+
+
+# Builds one Open-Meteo flatbuffers message (with daily values only), prefixed by its size like the real api.
+def buildWeatherApiResponse(pLat, pLong, pValues, pLocation=0, pModel=None):
+    builder = flatbuffers.Builder(1024 + sum(len(values) * 4 for values in pValues))
+
+    variables = []
+    for index, values in enumerate(pValues):
+        valuesVector = builder.CreateNumpyVector(values)
+        # VariableWithValues: variable (slot 0) and values (slot 3)
+        builder.StartObject(13)
+        builder.PrependUint8Slot(0, index, 0)
+        builder.PrependUOffsetTRelativeSlot(3, valuesVector, 0)
+        variables.append(builder.EndObject())
+
+    builder.StartVector(4, len(variables), 4)
+    for variable in reversed(variables):
+        builder.PrependUOffsetTRelative(variable)
+    variablesVector = builder.EndVector()
+
+    # VariablesWithTime: interval (slot 2) and variables (slot 3)
+    builder.StartObject(4)
+    builder.PrependInt32Slot(2, 86400, 0)
+    builder.PrependUOffsetTRelativeSlot(3, variablesVector, 0)
+    daily = builder.EndObject()
+
+    # WeatherApiResponse: latitude (slot 0), longitude (slot 1), location id (slot 4), model (slot 5) and daily (slot 10)
+    builder.StartObject(16)
+    builder.PrependFloat32Slot(0, pLat, 0.0)
+    builder.PrependFloat32Slot(1, pLong, 0.0)
+    builder.PrependInt64Slot(4, pLocation, 0)
+    builder.PrependUint8Slot(5, getattr(Model, pModel, 0) if pModel is not None else 0, 0)
+    builder.PrependUOffsetTRelativeSlot(10, daily, 0)
+    builder.FinishSizePrefixed(builder.EndObject())
+
+    return bytes(builder.Output())
+
+
+
+# Reads a (repeated or comma-separated) list parameter of a query.
+def getListParameter(pQuery, pName):
+    return [value for values in pQuery.get(pName, []) for value in values.split(',') if value != '']
+
+
+
+# Stand-in for the opentopodata, Open-Meteo archive/climate/elevation/geocoding and open-elevation endpoints.
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, pFormat, *pArgs):
+        pass
+
+    def sendBody(self, pBody, pContentType='application/json', pStatus=200):
+        self.send_response(pStatus)
+        self.send_header('Content-Type', pContentType)
+        self.send_header('Content-Length', str(len(pBody)))
+        self.end_headers()
+        self.wfile.write(pBody)
+
+    def sendJson(self, pData, pStatus=200):
+        self.sendBody(json.dumps(pData).encode(), pStatus=pStatus)
+
+    # Checks the batch limit of an endpoint. Returns False (after sending an error), if the request has too many locations.
+    def checkBatch(self, pEndpoint, pCount):
+        with requestCountsLock:
+            requestCounts[pEndpoint] = requestCounts.get(pEndpoint, 0) + 1
+
+        if pCount > batchLimits.get(pEndpoint, pCount):
+            self.sendJson({'error': True, 'reason': f"Too many locations: {pCount} > {batchLimits[pEndpoint]}"}, 400)
+            return False
+        return True
+
+    def do_GET(self):
+        time.sleep(latency)
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+
+        if url.path.endswith('/v1/archive') or url.path.endswith('/v1/climate'):
+            endpoint = 'archive' if url.path.endswith('/v1/archive') else 'climate'
+            lats = [float(lat) for lat in getListParameter(query, 'latitude')]
+            longs = [float(lon) for lon in getListParameter(query, 'longitude')]
+            if not self.checkBatch(endpoint, len(lats)):
+                return
+
+            variables = getListParameter(query, 'daily')
+            # One value per day of the requested range, like the real api.
+            start = datetime.date.fromisoformat(query.get('start_date', ['2020-01-01'])[0])
+            days = (datetime.date.fromisoformat(query.get('end_date', ['2020-12-31'])[0]) - start).days + 1
+            # One response per location and model (the models of a location next to each other), like the real api.
+            models = getListParameter(query, 'models') or [None]
+            body = b"".join(buildWeatherApiResponse(lat, lon, getDailyClimate(lat, lon, variables, days, endpoint == 'climate', model if len(models) > 1 else None), location, model)
+                            for location, (lat, lon) in enumerate(zip(lats, longs)) for model in models)
+            self.sendBody(body, 'application/octet-stream')
+
+        elif url.path.endswith('/v1/elevation'):
+            lats = getListParameter(query, 'latitude')
+            if not self.checkBatch('elevation', len(lats)):
+                return
+            self.sendJson({'elevation': getElevations(lats, getListParameter(query, 'longitude')).tolist()})
+
+        elif url.path.endswith('/v1/search'):
+            self.checkBatch('geocoding', 1)
+            # Every name gets a stable position.
+            seed = zlib.crc32(query.get('name', [''])[0].encode())
+            self.sendJson({'results': [{'name': query.get('name', [''])[0], 'latitude': round(seed % 12000 / 100 - 60, 4), 'longitude': round(seed // 12000 % 36000 / 100 - 180, 4)}]})
+
+        else:
+            # opentopodata: 'locations=lat,lon|lat,lon|...'
+            locations = [location.split(',') for location in query.get('locations', [''])[0].split('|') if location != '']
+            if not self.checkBatch('opentopodata', len(locations)):
+                return
+            elevations = getElevations([float(lat) for lat, _ in locations], [float(lon) for _, lon in locations])
+            self.sendJson({'status': 'OK', 'results': [{'elevation': elevation, 'location': {'lat': float(lat), 'lng': float(lon)}} for elevation, (lat, lon) in zip(elevations.tolist(), locations)]})
+
+    def do_POST(self):
+        time.sleep(latency)
+        # open-elevation: {"locations": [{"latitude": ..., "longitude": ...}, ...]}
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        locations = body.get('locations', [])
+        if not self.checkBatch('open-elevation', len(locations)):
+            return
+        elevations = getElevations([location['latitude'] for location in locations], [location['longitude'] for location in locations])
+        self.sendJson({'results': [dict(location, elevation=elevation) for location, elevation in zip(locations, elevations.tolist())]})
+
+
+
+# Starts the mock server in a background thread. Returns the server and its base url.
+def startMockServer(pLatency=None, pBatchLimits=None):
+    global latency
+
+    if pLatency is not None:
+        latency = pLatency
+    if pBatchLimits is not None:
+        batchLimits.update(pBatchLimits)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f"http://127.0.0.1:{server.server_port}"
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+
+# Writes a synthetic CMIP6-like NetCDF file with the daily max temperatures ('tasmax' in Kelvin) of the given years.
+# The layout (time x lat x lon, longitudes from 0 to 360) matches the data file the temperature lookup expects.
+def writeTemperatureData(pFile, pResolution=2.5, pYears=(2020, 2050), pSeed=0):
+    lats = np.arange(-90 + pResolution / 2, 90, pResolution)
+    lons = np.arange(0, 360, pResolution)
+    times = pd.DatetimeIndex(np.concatenate([pd.date_range(f"{year}-01-01", f"{year}-12-31", freq='D') for year in pYears]))
+
+    rng = np.random.default_rng(pSeed)
+    day = times.dayofyear.to_numpy(float)[:, None, None]
+    lat = lats[None, :, None]
+    lon = lons[None, None, :]
+    # Warmer at the equator, seasons with opposite signs on both hemispheres.
+    base = 300 - 40 * (np.abs(lat) / 90) ** 2 + 12 * np.sign(lat) * np.sin(2 * np.pi * (day - 80) / 365)
+    # The later years get warmer, more in some regions than in others, so some cells fail the temperature check.
+    warming = ((times.year.to_numpy() - pYears[0]) / 10)[:, None, None] * (0.5 + 2 * np.abs(np.sin(np.radians(lon) * 2) * np.cos(np.radians(lat))))
+
+    tasmax = np.empty((len(times), len(lats), len(lons)), dtype=np.float32)
+    for start in range(0, len(times), 64):
+        block = slice(start, start + 64)
+        tasmax[block] = base[block] + warming[block] + rng.normal(0, 2, (len(times[block]), len(lats), len(lons)))
+
+    dataset = xr.Dataset({'tasmax': (('time', 'lat', 'lon'), tasmax)}, coords={'time': times, 'lat': lats, 'lon': lons})
+    dataset['tasmax'].attrs['units'] = 'K'
+    dataset.to_netcdf(pFile)
+
+    return pFile
+
+
+
+# Returns a DataFrame of synthetic cities (name, latitude, longitude, population) spread over the land masses.
+def createCities(pCount, pSeed=0):
+    rng = np.random.default_rng(pSeed)
+
+    return pd.DataFrame({
+        'name': [f"City {index}" for index in range(pCount)],
+        'latitude': rng.uniform(-60, 70, pCount).round(4),
+        'longitude': rng.uniform(-180, 180, pCount).round(4),
+        'population': rng.integers(1000, 10000000, pCount)
+    })
@@ -0,0 +1,44 @@
+import importlib
+
+
+
+# Public functions and classes of the package and the module they live in. They get imported on their first use,
+# so 'import everland' doesn't load numpy, pandas, xarray or folium.
+exports = {
+    'climate': ['getTopTenMedian', 'getLegacyClimateData', 'getFutureClimateData', 'getClimateDataBatch', 'getLegacyClimateDataBatch', 'getFutureClimateDataBatch', 'calcPercentageIncrease', 'getTopTenMedianAlongTime', 'getTopKMedian', 'toYearBlocks', 'getAnnualTopKMedian', 'getPercentiles', 'getTrendSlope', 'getWindowStatistics', 'compareClimateStatistics', 'getClimateStatistics', 'getDailySeries', 'getClimateStatisticsBatch', 'getEnsembleClimateDataBatch', 'getEnsembleClimateData'],
+    'livable': ['evaluateLivable', 'createPipeline', 'runLimited', 'checkLivableAsync', 'streamLivable', 'runSync', 'checkLivable', 'evaluateEnsemble', 'checkLivableBatch', 'getClimateMetrics', 'getClimateMetricsVersion', 'readClimateMetrics', 'storeClimateMetrics', 'sensitivityAnalysis', 'printSensitivity', 'checkCityForLivable', 'checkCityForLivableAsync'],
+    'elevation': ['isStillAboveSeaLevelCordsMeteo', 'isStillAboveSeaLevelElevation', 'bruteforceElevation', 'isStillAboveSeaLevelCordsLocal', 'openDemTile', 'loadDemTiles', 'hasDemTiles', 'sampleDemTile', 'getElevationsDem', 'isStillAboveSeaLevelDem', 'isStillAboveSeaLevelCordsDem', 'TokenBucket', 'ElevationProvider', 'DemElevationProvider', 'LocalElevationProvider', 'MeteoElevationProvider', 'OpenElevationProvider', 'FallbackElevationProvider', 'getElevationProvider', 'getElevationBackendVersion', 'isStillAboveSeaLevel'],
+    'temperature': ['loadTemperatureGrid', 'getNearestIndex', 'lookupTemperatureChange', 'get_temperature_data'],
+    'sweep': ['sweepCoordinates', 'sweepRow', 'readSweepCheckpoint', 'appendSweepBatch', 'readSweepStore', 'writeGeoJsonFromStore', 'writeSweepResultsFromStore', 'getSweepStore', 'removeSweepStore', 'initSweepWorker', 'sweepBand', 'bruteforceCoordiantesToFile', 'getCellCorners', 'adaptiveCoordinatesToFile', 'createDummyFile'],
+    'results': ['appendToCSV', 'toSweepGrid', 'writeSweepResults', 'readSweepResults', 'readSweepGrid', 'loadSweepData', 'exportSweepToGeoJson', 'diffSweepResults', 'evaluateSeaLevelScenarios', 'classifyScenarios', 'summarizeScenarios', 'classifyCells', 'rasterizeClasses'],
+    'countries': ['rasterizeCountries', 'loadCountryGrid', 'assignCountries', 'aggregateByCountry'],
+    'cities': ['getCordinates', 'getCities', 'downloadCities', 'iterCities', 'getPopulationAtRisk', 'getTotalPopulationAtRisk'],
+    'gazetteer': ['normalizeName', 'buildGazetteer', 'loadGazetteer', 'lookupNames', 'searchPrefix', 'geocodeRemote', 'geocodeNames'],
+    'points': ['iterGeoJsonFeatures', 'useGeoJson', 'checkSeaLevelGeoJson', 'checkLivableGeoJson'],
+    'tiles': ['getTileBounds', 'renderTile', 'getChangedTiles', 'buildTilePyramid'],
+    'maps': ['plotLivable', 'plotOnlySeaLevel', 'buildCellFeatureCollection', 'buildCellImage', 'plotDataFromFile', 'plotRawDataFromFile'],
+    'cache': ['getResultCache', 'getResultCacheVersion', 'getResultCacheKeys', 'getCachedResults', 'putCachedResults', 'evictResultCache'],
+    'stats': ['startRunStats', 'countEvent', 'addStageTime', 'timeStage', 'getRunStats', 'mergeRunStats', 'writeRunSummary', 'Progress', 'formatDuration', 'countResponse'],
+}
+exportModules = {name: module for module, names in exports.items() for name in names}
+
+__all__ = sorted(exportModules)
+
+
+
+def __getattr__(pName):
+    if pName in exportModules:
+        return getattr(importlib.import_module(f"everland.{exportModules[pName]}"), pName)
+
+    # Submodules, e.g. 'everland.config'.
+    try:
+        return importlib.import_module(f"everland.{pName}")
+    except ModuleNotFoundError as e:
+        if e.name != f"everland.{pName}":
+            raise
+        raise AttributeError(f"module 'everland' has no attribute '{pName}'") from None
+
+
+
+def __dir__():
+    return __all__ + list(exports) + ['config']
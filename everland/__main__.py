@@ -0,0 +1,7 @@
+from everland.cli import main
+
+
+
+# Only run, if the package gets executed ('python -m everland') and not imported, e.g. by the worker processes of the parallel sweep.
+if __name__ == '__main__':
+    main()
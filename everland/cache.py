@@ -0,0 +1,122 @@
+import json
+import time
+import os
+import threading
+import sqlite3
+import hashlib
+from everland import config
+from everland.stats import countEvent
+
+
+
+# Connection to the result cache, one per thread. Gets opened by 'getResultCache'.
+resultCacheLocal = threading.local()
+
+
+
+# Opens the result cache for the current thread and process (SQLite connections can't be shared between them).
+def getResultCache():
+    if getattr(resultCacheLocal, 'pid', None) != os.getpid():
+        # Writers of other processes (e.g. the workers of the parallel sweep) get waited for up to a minute instead of failing.
+        connection = sqlite3.connect(config.resultCacheFile, timeout=60)
+        connection.execute("PRAGMA busy_timeout=60000")
+        # Allow parallel readers while one process writes.
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, lastAccess REAL NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS resultsLastAccess ON results (lastAccess)")
+        connection.commit()
+
+        resultCacheLocal.connection = connection
+        resultCacheLocal.pid = os.getpid()
+        resultCacheLocal.inserted = 0
+        resultCacheLocal.accessed = {}
+
+    return resultCacheLocal.connection
+
+
+
+# Builds a short version string from everything a cached result depends on (e.g. the dataset or the request parameters).
+def getResultCacheVersion(*pParts):
+    return hashlib.sha1(json.dumps(pParts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+
+# Builds the cache keys of the given coordinates: the kind of result, its version and the rounded coordinates.
+def getResultCacheKeys(pKind, pLats, pLongs, pVersion):
+    return [f"{pKind}|{pVersion}|{round(float(lat), config.resultCacheDigits)}|{round(float(lon), config.resultCacheDigits)}" for lat, lon in zip(pLats, pLongs)]
+
+
+
+# Returns the cached results of the given coordinates (None if there is no result yet).
+def getCachedResults(pKind, pLats, pLongs, pVersion):
+    keys = getResultCacheKeys(pKind, pLats, pLongs, pVersion)
+
+    # The cache can be switched off by setting the file to None.
+    if config.resultCacheFile is None or len(keys) == 0:
+        return [None] * len(keys)
+
+    connection = getResultCache()
+    found = {}
+
+    # Query the keys in chunks, SQLite limits the number of parameters per statement.
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        found.update(connection.execute(f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+
+    # Mark the results as used, so they are the last to get evicted. Reads don't write, the access times get saved
+    # with the next new results (or once enough of them piled up).
+    if len(found) > 0:
+        now = time.time()
+        resultCacheLocal.accessed.update((key, now) for key in found)
+        if len(resultCacheLocal.accessed) >= 10000:
+            flushResultCacheAccess()
+            connection.commit()
+
+    countEvent(f"cache.{pKind}.hits", len(found))
+    countEvent(f"cache.{pKind}.misses", len(keys) - len(found))
+
+    return [json.loads(found[key]) if key in found else None for key in keys]
+
+
+
+# Saves the results of the given coordinates in the cache.
+def putCachedResults(pKind, pLats, pLongs, pVersion, pValues):
+    if config.resultCacheFile is None or len(pValues) == 0:
+        return
+
+    connection = getResultCache()
+    now = time.time()
+    keys = getResultCacheKeys(pKind, pLats, pLongs, pVersion)
+
+    flushResultCacheAccess()
+    connection.executemany("INSERT OR REPLACE INTO results (key, value, lastAccess) VALUES (?, ?, ?)", [(key, json.dumps(value), now) for key, value in zip(keys, pValues)])
+    connection.commit()
+
+    # Counting all entries isn't free, so only check the size limit every few thousand new entries.
+    resultCacheLocal.inserted += len(keys)
+    if resultCacheLocal.inserted >= 10000:
+        resultCacheLocal.inserted = 0
+        evictResultCache()
+
+
+
+# Writes the access times of the results read since the last write (in the transaction of the caller).
+def flushResultCacheAccess():
+    connection = getResultCache()
+
+    if len(resultCacheLocal.accessed) > 0:
+        connection.executemany("UPDATE results SET lastAccess = ? WHERE key = ?", [(now, key) for key, now in resultCacheLocal.accessed.items()])
+        resultCacheLocal.accessed = {}
+
+
+
+# Removes the least recently used results, if the cache holds more than 'resultCacheMaxEntries' results.
+def evictResultCache():
+    connection = getResultCache()
+    flushResultCacheAccess()
+    connection.commit()
+    count = connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    if count > config.resultCacheMaxEntries:
+        connection.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY lastAccess LIMIT ?)", (count - config.resultCacheMaxEntries,))
+        connection.commit()
@@ -0,0 +1,130 @@
+from everland import config
+from everland.gazetteer import geocodeNames
+from everland.points import iterGeoJsonFeatures
+from everland.results import classifyCells, readSweepGrid
+from everland.temperature import getNearestIndex
+from everland.lazy import LazyModule
+
+pd = LazyModule('pandas')
+requests = LazyModule('requests')
+
+
+
+# Return latitude and longitude for a given city name.
+def getCordinates(pName):
+    # The offline gazetteer first, Open-Meteos geocoding api only for names it doesn't know.
+    place = geocodeNames([pName]).iloc[0]
+    if not place['found']:
+        raise ValueError(f"Unknown place: '{pName}'")
+
+    return place['latitude'], place['longitude']
+
+
+
+# Returns the 'pLimit' biggest cities with more than 'pMinPopulation' inhabitants.
+# The records api only returns the first 'citiesMaxOffset' (10000) records, use 'iterCities' for more.
+def getCities(pMinPopulation, pLimit=100):
+    if pLimit > config.citiesMaxOffset:
+        raise ValueError(f"The cities api only returns the first {config.citiesMaxOffset} cities, use 'iterCities' (or 'everland cities --file') for {pLimit}.")
+
+    results = []
+
+    # The api returns at most 100 records per request, so page through them with an offset.
+    for offset in range(0, pLimit, 100):
+        # Constructing the URL for the API request
+        url = f"{config.citiesApi}/records?select=name%2Cpopulation%2Ccoordinates&where=population%3E{pMinPopulation}&order_by=population%20desc&limit={min(100, pLimit - offset)}&offset={offset}"
+
+        # Sending a GET request to the API
+        response = requests.get(url)
+        # Parsing the JSON response and extracting the results
+        page = response.json()["results"]
+        results += page
+
+        # Stop, if there are no more records.
+        if len(page) < min(100, pLimit - offset):
+            break
+
+    # Flattening all results at once ('coordinates.lat' and 'coordinates.lon' become columns)
+    df = pd.json_normalize(results)
+    df = df.rename(columns={'coordinates.lat': 'latitude', 'coordinates.lon': 'longitude'})
+
+    # Returning the DataFrame with the specified column order
+    return df.reindex(columns=['name', 'population', 'latitude', 'longitude'])
+
+
+
+# Downloads all cities with more than 'pMinPopulation' inhabitants as one GeoJSON export (streamed to disk, without paging).
+def downloadCities(pMinPopulation, pFile):
+    url = f"{config.citiesApi}/exports/geojson?select=name%2Cpopulation%2Ccoordinates&where=population%3E{pMinPopulation}"
+
+    with requests.get(url, stream=True) as response:
+        response.raise_for_status()
+        with open(pFile, 'wb') as f:
+            for block in response.iter_content(1 << 20):
+                f.write(block)
+
+    return pFile
+
+
+
+# Reads cities in chunks of DataFrames (name, population, latitude, longitude), without loading all of them at once.
+# 'pFile' can be a GeoNames dump ('cities1000.txt'), a GeoJSON file or None, which downloads the export of the api first.
+def iterCities(pMinPopulation=1000, pFile=None, pChunkSize=10000):
+    if pFile is None:
+        pFile = downloadCities(pMinPopulation, f"./geojson/cities{pMinPopulation}.geojson")
+
+    if pFile.endswith('.txt'):
+        # GeoNames dumps are tab-separated without a header: name is the 2nd, latitude/longitude the 5th/6th and population the 15th column.
+        for chunk in pd.read_csv(pFile, sep='\t', header=None, usecols=[1, 4, 5, 14], names=['name', 'latitude', 'longitude', 'population'],
+                                 quoting=3, chunksize=pChunkSize, dtype={1: str}, keep_default_na=False):
+            chunk = chunk[chunk['population'] > pMinPopulation]
+            if len(chunk) > 0:
+                yield chunk[['name', 'population', 'latitude', 'longitude']].reset_index(drop=True)
+    else:
+        for chunk in iterGeoJsonFeatures(pFile, pChunkSize, pNameProperty='name'):
+            chunk = pd.DataFrame(chunk)
+            chunk = chunk[chunk['population'] > pMinPopulation]
+            if len(chunk) > 0:
+                yield chunk.reset_index(drop=True)
+
+
+
+# Joins cities with a precomputed sweep grid: every city gets the classification of its nearest cell.
+# Returns the cities with their classification and the population totals (no network calls needed).
+# The cells get classified like on the maps ('classifyCells'), so cities on sea cells (elevation 0) or failed lookups count as unknown.
+def getPopulationAtRisk(pCities, pSweepFile):
+    grid = readSweepGrid(pSweepFile)
+
+    # Nearest cell of every city, for all cities at once.
+    rows = getNearestIndex(grid['latitude'], pCities['latitude'].to_numpy(float))
+    cols = getNearestIndex(grid['longitude'], pCities['longitude'].to_numpy(float))
+
+    cities = pCities.copy()
+    cities['elevation'] = grid['elevation'][rows, cols]
+    cities['aboveSea'] = grid['aboveSea'][rows, cols] == 1
+    cities['tempChangeOK'] = grid['tempChangeOK'][rows, cols] == 1
+    classes = classifyCells(cities)
+
+    population = cities['population'].to_numpy(float)
+    flooded = classes == 1
+    tooHot = classes == 2
+
+    return cities, {
+        'population': float(population.sum()),
+        'floodedPopulation': float(population[flooded].sum()),
+        'temperaturePopulation': float(population[tooHot].sum()),
+        'populationAtRisk': float(population[flooded | tooHot].sum()),
+        'unknownPopulation': float(population[classes == 0].sum())
+    }
+
+
+
+# Sums up the population at risk for a (large) city list, chunk by chunk (see 'iterCities').
+def getTotalPopulationAtRisk(pSweepFile, pMinPopulation=1000, pFile=None):
+    totals = {}
+    for chunk in iterCities(pMinPopulation, pFile):
+        _, chunkTotals = getPopulationAtRisk(chunk, pSweepFile)
+        for key, value in chunkTotals.items():
+            totals[key] = totals.get(key, 0.0) + value
+
+    return totals
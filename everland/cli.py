@@ -0,0 +1,143 @@
+import argparse
+import sys
+from everland import config
+
+
+
+# The commands only import the modules they need, so 'everland --help' and light commands start fast.
+def runSweep(pArgs):
+    from everland import sweep
+
+    if pArgs.dummy:
+        sweep.createDummyFile(pArgs.max_lat, pArgs.max_lon, pArgs.steps)
+    elif pArgs.adaptive is not None:
+        sweep.adaptiveCoordinatesToFile(pArgs.max_lat, pArgs.max_lon, pArgs.adaptive, pArgs.steps, pGeoJson=pArgs.geojson)
+    else:
+        sweep.bruteforceCoordiantesToFile(pArgs.max_lat, pArgs.max_lon, pArgs.steps, pWorkers=pArgs.workers, pGeoJson=pArgs.geojson, pRestart=pArgs.restart)
+
+
+
+def runPlot(pArgs):
+    from everland import maps
+
+    if pArgs.raw:
+        maps.plotRawDataFromFile(pArgs.file)
+    else:
+        maps.plotDataFromFile(pArgs.file, pArgs.mode, pMaxZoom=pArgs.max_zoom, pWorkers=pArgs.workers)
+
+
+
+def runCities(pArgs):
+    from everland import cities, livable, maps
+
+    if pArgs.file is not None:
+        # Only the first chunk of a (large) GeoNames or GeoJSON file.
+        locations = next(cities.iterCities(pArgs.min_population, pArgs.file, pArgs.limit), None)
+        if locations is None:
+            sys.exit(f"No cities with more than {pArgs.min_population} inhabitants in '{pArgs.file}'.")
+        locations = locations.head(pArgs.limit)
+    else:
+        locations = cities.getCities(pArgs.min_population, pArgs.limit)
+
+    if pArgs.parallel:
+        livable.checkCityForLivableAsync(locations)
+    else:
+        livable.checkCityForLivable(locations)
+
+    if pArgs.plot:
+        maps.plotLivable(locations)
+
+
+
+def runCheck(pArgs):
+    from everland import cities, livable
+
+    if pArgs.name is not None:
+        lat, lon = cities.getCordinates(pArgs.name)
+    else:
+        lat, lon = pArgs.lat, pArgs.lon
+
+    livable.checkLivable(lat, lon, pArgs.temperature_grid)
+
+
+
+def runGeocode(pArgs):
+    from everland import gazetteer
+
+    if pArgs.build is not None:
+        gazetteer.buildGazetteer(pArgs.build, pMinPopulation=pArgs.min_population, pAlternateNames=pArgs.alternate_names)
+
+    if pArgs.prefix:
+        for name in pArgs.names:
+            print(gazetteer.searchPrefix(name, pArgs.limit).to_string(index=False))
+    elif len(pArgs.names) > 0:
+        print(gazetteer.geocodeNames(pArgs.names).to_string(index=False))
+
+
+
+def createParser():
+    parser = argparse.ArgumentParser(prog='everland', description="Checks, which places will still be livable in 2050.")
+    parser.add_argument('--sea-level-rise', type=float, default=None, help=f"worst case sea level rise in meters (default: {config.seaLevelRise})")
+    parser.add_argument('--ensemble', action='store_true', help="also check the places with the ensemble of all CMIP6 models")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sweep = commands.add_parser('sweep', help="check a grid of coordinates for the sea level and the temperature change")
+    sweep.add_argument('--steps', type=int, default=25, help="grid size in degrees (the target size of an adaptive sweep)")
+    sweep.add_argument('--max-lat', type=int, default=90)
+    sweep.add_argument('--max-lon', type=int, default=180)
+    # Number of processes for the parallel sweep.
+    sweep.add_argument('--workers', type=int, default=1)
+    sweep.add_argument('--adaptive', type=float, default=None, metavar='START_STEPS', help="sample adaptively, starting with cells of this size")
+    sweep.add_argument('--geojson', action='store_true', help="also write the results as geojson")
+    sweep.add_argument('--restart', action='store_true', help="don't continue a previous sweep with the same settings, sweep all rows again")
+    sweep.add_argument('--dummy', action='store_true', help="only write a grid of empty records")
+    sweep.set_defaults(function=runSweep)
+
+    plot = commands.add_parser('plot', help="draw the results of a sweep on a map")
+    plot.add_argument('file')
+    plot.add_argument('--mode', choices=['image', 'geojson', 'rectangles', 'tiles'], default='image')
+    plot.add_argument('--max-zoom', type=int, default=None, help="highest zoom level of the tile pyramid (--mode tiles)")
+    plot.add_argument('--workers', type=int, default=None, help="processes, which render the tiles (--mode tiles)")
+    plot.add_argument('--raw', action='store_true', help="only draw the points of the file")
+    plot.set_defaults(function=runPlot)
+
+    cities = commands.add_parser('cities', help="check the biggest cities for livability")
+    cities.add_argument('--min-population', type=int, default=1000000)
+    cities.add_argument('--limit', type=int, default=100)
+    cities.add_argument('--file', default=None, help="GeoNames (.txt) or GeoJSON file instead of the cities api")
+    cities.add_argument('--parallel', action='store_true', help="check the cities concurrently and print them as soon as they are done")
+    cities.add_argument('--plot', action='store_true', help="draw the cities on a map")
+    cities.set_defaults(function=runCities)
+
+    check = commands.add_parser('check', help="check a single place for livability")
+    check.add_argument('name', nargs='?', default=None, help="name of the place")
+    check.add_argument('--lat', type=float, default=None)
+    check.add_argument('--lon', type=float, default=None)
+    check.add_argument('--temperature-grid', action='store_true', help="use the temperature change of the NetCDF file")
+    check.set_defaults(function=runCheck)
+
+    geocode = commands.add_parser('geocode', help="look up the coordinates of places in the offline gazetteer")
+    geocode.add_argument('names', nargs='*', help="names of the places")
+    geocode.add_argument('--build', default=None, metavar='FILE', help="build the gazetteer from a GeoNames dump first")
+    geocode.add_argument('--min-population', type=int, default=0, help="only index places with at least this population")
+    geocode.add_argument('--alternate-names', action='store_true', help="also index the alternate names of the places")
+    geocode.add_argument('--prefix', action='store_true', help="list the biggest places, whose names start with the given names")
+    geocode.add_argument('--limit', type=int, default=10)
+    geocode.set_defaults(function=runGeocode)
+
+    return parser
+
+
+
+def main(pArgs=None):
+    parser = createParser()
+    args = parser.parse_args(pArgs)
+
+    if args.command == 'check' and args.name is None and (args.lat is None or args.lon is None):
+        parser.error("check needs a name or --lat and --lon")
+    if args.sea_level_rise is not None:
+        config.seaLevelRise = args.sea_level_rise
+    if args.ensemble:
+        config.climateEnsemble = True
+
+    args.function(args)
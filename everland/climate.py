@@ -0,0 +1,445 @@
+import warnings
+from everland import config
+from everland.cache import getCachedResults, getResultCacheVersion, putCachedResults
+from everland.sessions import getClimateClient
+from everland.stats import timeStage
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+openmeteoModel = LazyModule('openmeteo_sdk.Model')
+
+
+
+# Calculates the median of the ten highest data points in a given data set.
+def getTopTenMedian(pData):
+    return getTopKMedian(np.asarray(pData, dtype=float), 10)
+
+
+
+# Returns the days of the 'start_date' to 'end_date' range of the api parameters.
+def getParamsDates(pParams):
+    return pd.date_range(pParams['start_date'], pParams['end_date'], freq='D')
+
+
+
+# Reads the daily variables of the api responses (one per location) into a (variable x location x day) array.
+# Missing days at the end of a response are NaN.
+def readDailyValues(pResponses, pVariables, pDays):
+    values = np.full((pVariables, len(pResponses), pDays), np.nan, dtype=np.float32)
+
+    for location, response in enumerate(pResponses):
+        # Extract the daily variables from the response (only once).
+        daily = response.Daily()
+        for variable in range(pVariables):
+            series = daily.Variables(variable).ValuesAsNumpy()[:pDays]
+            values[variable, location, :len(series)] = series
+
+    return values
+
+
+
+# Queries the Open-Meteo Api for legacy weather data (the baseline years, 2020 by default).
+def getLegacyClimateData(pLat, pLong):
+    # API url of the archive
+    url = config.archiveApi
+    # Query Temerature, Rainfall and windspeed for the baseline years.
+    params = {
+        "latitude": pLat,
+        "longitude": pLong,
+        "start_date": f"{config.baselineYears[0]}-01-01",
+        "end_date": f"{config.baselineYears[1]}-12-31",
+        "daily": ["temperature_2m_max", "precipitation_sum", "wind_speed_10m_max"],
+        "timezone": "Europe/Berlin"
+    }
+
+    # Use the cached medians of this location, if there are any.
+    version = getResultCacheVersion(url, {key: value for key, value in params.items() if key not in ('latitude', 'longitude')})
+    cached = getCachedResults('legacy', [pLat], [pLong], version)[0]
+    if cached is not None:
+        return tuple(cached)
+
+    # Save the api response (as an array)
+    responses = getClimateClient().weather_api(url, params=params)
+    # Use 0, because no model is specified. Use [] to use multiple models.
+    dates = getParamsDates(params)
+    values = readDailyValues(responses[:1], len(params['daily']), len(dates))[:, 0]
+
+    # The max temperature 2m above the ground, the daily rain+snow fall and the max windspeed 10m above the ground.
+    temperature_2m_max, precipitation_sum, wind_speed_10m_max = getAnnualTopKMedian(values, dates)
+
+    # Save the medians for the next time.
+    putCachedResults('legacy', [pLat], [pLong], version, [[float(temperature_2m_max), float(precipitation_sum), float(wind_speed_10m_max)]])
+
+    # Return the previously saved variables.
+    return temperature_2m_max, precipitation_sum, wind_speed_10m_max
+
+
+
+# Queries the Open-Meteo Api for future weather data (the target years, 2050 by default).
+def getFutureClimateData(pLat, pLong):
+    # API url of the weather prediction
+    url = config.climateApi
+    # Query Temerature, Rainfall and windspeed for the target years.
+    params = {
+        "latitude": pLat,
+        "longitude": pLong,
+        "start_date": f"{config.targetYears[0]}-01-01",
+        "end_date": f"{config.targetYears[1]}-12-31",
+        "models": [config.climateModel],
+        "daily": ["temperature_2m_max", "precipitation_sum", "wind_speed_10m_max"],
+        "timezone": "Europe/Berlin"
+    }
+
+    # Use the cached medians of this location, if there are any.
+    version = getResultCacheVersion(url, {key: value for key, value in params.items() if key not in ('latitude', 'longitude')})
+    cached = getCachedResults('future', [pLat], [pLong], version)[0]
+    if cached is not None:
+        return tuple(cached)
+
+    # Save the api response (as an array)
+    responses = getClimateClient().weather_api(url, params=params)
+    # Use 0, because only one model is specified.
+    dates = getParamsDates(params)
+    values = readDailyValues(responses[:1], len(params['daily']), len(dates))[:, 0]
+
+    # The max temperature 2m above the ground, the daily rain+snow fall and the max windspeed 10m above the ground.
+    temperature_2m_max, precipitation_sum, wind_speed_10m_max = getAnnualTopKMedian(values, dates)
+
+    # Save the medians for the next time.
+    putCachedResults('future', [pLat], [pLong], version, [[float(temperature_2m_max), float(precipitation_sum), float(wind_speed_10m_max)]])
+
+    # Return the previously saved variables.
+    return temperature_2m_max, precipitation_sum, wind_speed_10m_max
+
+
+
+# Queries an Open-Meteo api for the daily values of up to one batch of locations in a single request.
+# Returns a (variable x location x day) array and the days.
+def getDailySeries(pUrl, pParams, pLats, pLongs, pPrefix):
+    params = dict(pParams, latitude=list(pLats), longitude=list(pLongs))
+    dates = getParamsDates(pParams)
+
+    # The api returns one response per location, in the order of the requested locations.
+    with timeStage(f"climate.{pPrefix}"):
+        responses = getClimateClient().weather_api(pUrl, params=params)
+
+    return readDailyValues(responses, len(pParams['daily']), len(dates)), dates
+
+
+
+# Queries an Open-Meteo api for all given locations, using as few requests as possible.
+# Returns the median of the ten highest values of every daily variable per location (averaged over the years).
+def getClimateDataBatch(pUrl, pParams, pLocations, pPrefix, pBatchSize=None):
+    # Use the location limit of the api, if no batch size is given.
+    if pBatchSize is None:
+        pBatchSize = config.climateBatchSize
+
+    lats = pLocations['latitude'].to_numpy(float)
+    longs = pLocations['longitude'].to_numpy(float)
+    medians = np.full((len(lats), len(pParams['daily'])), np.nan)
+
+    # Use the cached medians and only query the locations, which weren't queried before.
+    version = getResultCacheVersion(pUrl, pParams)
+    cached = getCachedResults(pPrefix, lats, longs, version)
+    for index, value in enumerate(cached):
+        if value is not None:
+            medians[index] = value
+    missing = np.array([index for index, value in enumerate(cached) if value is None], dtype=int)
+
+    # Split the locations into chunks the api accepts in a single request.
+    for start in range(0, len(missing), pBatchSize):
+        chunk = missing[start:start + pBatchSize]
+        values, dates = getDailySeries(pUrl, pParams, lats[chunk].tolist(), longs[chunk].tolist(), pPrefix)
+
+        # Reduce the (variable x location x day) array of all locations in one go.
+        medians[chunk] = getAnnualTopKMedian(values, dates).T
+
+        # Save the medians for the next time.
+        putCachedResults(pPrefix, lats[chunk], longs[chunk], version, medians[chunk].tolist())
+
+    return pd.DataFrame(medians, index=pLocations.index, columns=[f"{pPrefix}_{name}" for name in pParams['daily']])
+
+
+
+# Queries the Open-Meteo Api for legacy weather data (the baseline years) of all given locations.
+def getLegacyClimateDataBatch(pLocations, pBatchSize=None):
+    # Query Temerature, Rainfall and windspeed for the baseline years.
+    params = {
+        "start_date": f"{config.baselineYears[0]}-01-01",
+        "end_date": f"{config.baselineYears[1]}-12-31",
+        "daily": ["temperature_2m_max", "precipitation_sum", "wind_speed_10m_max"],
+        "timezone": "Europe/Berlin"
+    }
+
+    return getClimateDataBatch(config.archiveApi, params, pLocations, 'legacy', pBatchSize)
+
+
+
+# Queries the Open-Meteo Api for future weather data (the target years) of all given locations.
+def getFutureClimateDataBatch(pLocations, pBatchSize=None):
+    # Query Temerature, Rainfall and windspeed for the target years.
+    params = {
+        "start_date": f"{config.targetYears[0]}-01-01",
+        "end_date": f"{config.targetYears[1]}-12-31",
+        "models": [config.climateModel],
+        "daily": ["temperature_2m_max", "precipitation_sum", "wind_speed_10m_max"],
+        "timezone": "Europe/Berlin"
+    }
+
+    return getClimateDataBatch(config.climateApi, params, pLocations, 'future', pBatchSize)
+
+
+
+# Reads the responses of a request with several models (one response per location and model) into a (model x variable x location x day) array.
+# Every response names the index of its location in the request and its model. Models without data for a location stay NaN.
+def readEnsembleValues(pResponses, pModels, pVariables, pLocations, pDays):
+    models = {getattr(openmeteoModel.Model, model): index for index, model in enumerate(pModels)}
+    values = np.full((len(pModels), pVariables, pLocations, pDays), np.nan, dtype=np.float32)
+
+    for response in pResponses:
+        model = models.get(response.Model())
+        if model is None:
+            continue
+
+        daily = response.Daily()
+        for variable in range(pVariables):
+            series = daily.Variables(variable).ValuesAsNumpy()[:pDays]
+            values[model, variable, response.LocationId(), :len(series)] = series
+
+    return values
+
+
+
+# Queries the future weather data (the target years) of all models of the ensemble for all given locations.
+# All models of a batch of locations come with a single request. Returns the medians of the ten highest values as (location x model x variable) array.
+def getEnsembleClimateDataBatch(pLocations, pModels=None, pBatchSize=None):
+    if pModels is None:
+        pModels = config.climateModels
+    # Use the location limit of the api, if no batch size is given.
+    if pBatchSize is None:
+        pBatchSize = config.climateBatchSize
+
+    params = {
+        "start_date": f"{config.targetYears[0]}-01-01",
+        "end_date": f"{config.targetYears[1]}-12-31",
+        "models": list(pModels),
+        "daily": ["temperature_2m_max", "precipitation_sum", "wind_speed_10m_max"],
+        "timezone": "Europe/Berlin"
+    }
+    dates = getParamsDates(params)
+
+    lats = pLocations['latitude'].to_numpy(float)
+    longs = pLocations['longitude'].to_numpy(float)
+    medians = np.full((len(lats), len(pModels), len(params['daily'])), np.nan)
+
+    # Use the cached medians and only query the locations, which weren't queried before.
+    version = getResultCacheVersion(config.climateApi, params)
+    cached = getCachedResults('ensemble', lats, longs, version)
+    for index, value in enumerate(cached):
+        if value is not None:
+            medians[index] = np.reshape(value, medians.shape[1:])
+    missing = np.array([index for index, value in enumerate(cached) if value is None], dtype=int)
+
+    for start in range(0, len(missing), pBatchSize):
+        chunk = missing[start:start + pBatchSize]
+
+        with timeStage('climate.ensemble'):
+            responses = getClimateClient().weather_api(config.climateApi, params=dict(params, latitude=lats[chunk].tolist(), longitude=longs[chunk].tolist()))
+
+        # Reduce the (model x variable x location x day) array of all models and locations in one go.
+        values = readEnsembleValues(responses, pModels, len(params['daily']), len(chunk), len(dates))
+        medians[chunk] = np.moveaxis(getAnnualTopKMedian(values, dates), -1, 0)
+
+        # Save the medians for the next time.
+        putCachedResults('ensemble', lats[chunk], longs[chunk], version, medians[chunk].reshape(len(chunk), -1).tolist())
+
+    return medians
+
+
+
+# Queries the future weather data of all models of the ensemble for a single location. Returns a (model x variable) array.
+def getEnsembleClimateData(pLat, pLong, pModels=None):
+    return getEnsembleClimateDataBatch(pd.DataFrame({'latitude': [pLat], 'longitude': [pLong]}), pModels)[0]
+
+
+
+# Calculates the difference between the two given numbers in percent
+def calcPercentageIncrease(pLegacy, pFuture):
+    percentage = ((pFuture - pLegacy) / pLegacy) * 100
+    return round(percentage, 3)
+
+
+
+# Calculates the median of the ten highest values along the given (time) axis of an array.
+def getTopTenMedianAlongTime(pData, pAxis=0):
+    return getTopKMedian(pData, 10, pAxis)
+
+
+
+# Calculates the median of the k highest values along the given axis of an array (of any shape).
+def getTopKMedian(pData, pK=10, pAxis=-1):
+    # Missing values must never end up among the k highest ones.
+    data = np.moveaxis(np.where(np.isnan(pData), -np.inf, pData), pAxis, -1)
+    k = min(pK, data.shape[-1])
+    # Move the k highest values of every row to the end, without sorting the whole row.
+    topK = np.partition(data, data.shape[-1] - k, axis=-1)[..., -k:]
+    # Rows with less than k valid values have no meaningful median.
+    topK = np.where(np.isinf(topK), np.nan, topK)
+    return np.median(topK, axis=-1)
+
+
+
+# Arranges daily values (... x day) by year: (... x year x day of the year). Days missing in a year (e.g. the 29th of February) are NaN.
+def toYearBlocks(pValues, pDates):
+    dates = pd.DatetimeIndex(pDates)
+    years = np.unique(dates.year)
+
+    blocks = np.full(np.shape(pValues)[:-1] + (len(years), 366), np.nan, dtype=np.float32)
+    blocks[..., np.searchsorted(years, dates.year), dates.dayofyear - 1] = pValues
+    return blocks, years
+
+
+
+# Calculates the median of the k highest values of every year of daily values (... x day), averaged over the years.
+# For a single year it's the plain median of the k highest values.
+def getAnnualTopKMedian(pValues, pDates, pK=10):
+    blocks, years = toYearBlocks(pValues, pDates)
+
+    # Years without (enough) values are NaN and get skipped.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmean(getTopKMedian(blocks, pK), axis=-1)
+
+
+
+# Calculates percentiles (0 to 100) along the given axis, ignoring NaNs. Returns the percentiles as the last axis.
+# Unlike np.nanpercentile, all rows get processed at once: sorting moves the NaNs to the end of every row.
+def getPercentiles(pData, pPercentiles, pAxis=-1):
+    data = np.sort(np.moveaxis(pData, pAxis, -1), axis=-1)
+    counts = np.count_nonzero(~np.isnan(data), axis=-1)[..., None]
+
+    # Interpolate linearly between the closest ranks, like np.percentile.
+    last = np.maximum(counts - 1, 0)
+    positions = np.asarray(pPercentiles, dtype=float) / 100 * last
+    lower = np.floor(positions).astype(np.intp)
+    lowerValues = np.take_along_axis(data, lower, axis=-1)
+    upperValues = np.take_along_axis(data, np.minimum(lower + 1, last), axis=-1)
+
+    return np.where(counts > 0, lowerValues + (upperValues - lowerValues) * (positions - lower), np.nan)
+
+
+
+# Calculates the least squares slope of values (... x n) over x (n), ignoring NaNs. Rows with less than two values are NaN.
+def getTrendSlope(pValues, pX):
+    valid = ~np.isnan(pValues)
+    counts = np.count_nonzero(valid, axis=-1)
+    x = np.where(valid, np.asarray(pX, dtype=float), 0.0)
+    y = np.where(valid, pValues, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xMean = x.sum(axis=-1, keepdims=True) / counts[..., None]
+        yMean = y.sum(axis=-1, keepdims=True) / counts[..., None]
+        dx = np.where(valid, x - xMean, 0.0)
+        slope = (dx * (y - yMean)).sum(axis=-1) / (dx ** 2).sum(axis=-1)
+
+    return np.where(counts >= 2, slope, np.nan)
+
+
+
+# Calculates the statistics of a window of years (first and last year) of daily values, arranged by 'toYearBlocks':
+# the median of the k highest values (averaged over the years), the mean, percentiles of all days and the trend of the annual means per decade.
+def getWindowStatistics(pBlocks, pYears, pWindow, pTopK=10, pPercentiles=(50, 90, 99)):
+    selected = (pYears >= pWindow[0]) & (pYears <= pWindow[1])
+    blocks = pBlocks[..., selected, :]
+    days = blocks.reshape(blocks.shape[:-2] + (-1,))
+
+    # Years (and locations) without values are NaN.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        annualMeans = np.nanmean(blocks, axis=-1)
+        result = {
+            'topKMedian': np.nanmean(getTopKMedian(blocks, pTopK), axis=-1),
+            'mean': np.nanmean(days, axis=-1),
+            'trend': getTrendSlope(annualMeans, pYears[selected]) * 10,
+            'years': np.count_nonzero(~np.isnan(annualMeans), axis=-1)
+        }
+
+    if len(pPercentiles) > 0:
+        percentiles = getPercentiles(days, pPercentiles)
+        for index, percentile in enumerate(pPercentiles):
+            result[f"p{percentile:g}"] = percentiles[..., index]
+
+    return result
+
+
+
+# Compares the statistics of the baseline and the target window. Returns both, the differences and the differences in percent.
+def compareClimateStatistics(pBaseline, pTarget):
+    result = {}
+    for name in pBaseline:
+        result[f"baseline_{name}"] = pBaseline[name]
+        result[f"target_{name}"] = pTarget[name]
+
+    for name in pBaseline:
+        if name in ('years', 'trend'):
+            continue
+        result[f"change_{name}"] = pTarget[name] - pBaseline[name]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[f"percentage_{name}"] = (pTarget[name] - pBaseline[name]) / pBaseline[name] * 100
+
+    return result
+
+
+
+# Calculates the climate statistics of daily values (... x day, e.g. location x day or variable x location x day), which cover
+# the baseline and the target years, in one vectorized call. The windows are (first year, last year), by default the ones of the config.
+def getClimateStatistics(pValues, pDates, pBaseline=None, pTarget=None, pTopK=10, pPercentiles=(50, 90, 99)):
+    if pBaseline is None:
+        pBaseline = config.baselineYears
+    if pTarget is None:
+        pTarget = config.targetYears
+
+    blocks, years = toYearBlocks(pValues, pDates)
+    baseline = getWindowStatistics(blocks, years, pBaseline, pTopK, pPercentiles)
+    target = getWindowStatistics(blocks, years, pTarget, pTopK, pPercentiles)
+
+    return compareClimateStatistics(baseline, target)
+
+
+
+# Queries the past (archive) and the future (CMIP6) daily values of all given locations and compares the baseline and the target years.
+# Returns a DataFrame with one column per variable and statistic (e.g. 'temperature_2m_max_change_p90').
+# The daily values aren't cached, only one batch of locations is in memory at once.
+def getClimateStatisticsBatch(pLocations, pBaseline=None, pTarget=None, pTopK=10, pPercentiles=(50, 90, 99), pBatchSize=None):
+    if pBaseline is None:
+        pBaseline = config.baselineYears
+    if pTarget is None:
+        pTarget = config.targetYears
+    if pBatchSize is None:
+        pBatchSize = config.climateBatchSize
+
+    variables = ["temperature_2m_max", "precipitation_sum", "wind_speed_10m_max"]
+    legacyParams = {"start_date": f"{pBaseline[0]}-01-01", "end_date": f"{pBaseline[1]}-12-31", "daily": variables, "timezone": "Europe/Berlin"}
+    futureParams = dict(legacyParams, start_date=f"{pTarget[0]}-01-01", end_date=f"{pTarget[1]}-12-31", models=[config.climateModel])
+
+    lats = pLocations['latitude'].to_numpy(float)
+    longs = pLocations['longitude'].to_numpy(float)
+    chunks = []
+
+    for start in range(0, len(lats), pBatchSize):
+        chunk = slice(start, start + pBatchSize)
+        legacyValues, legacyDates = getDailySeries(config.archiveApi, legacyParams, lats[chunk].tolist(), longs[chunk].tolist(), 'legacy')
+        futureValues, futureDates = getDailySeries(config.climateApi, futureParams, lats[chunk].tolist(), longs[chunk].tolist(), 'future')
+
+        with timeStage('climateStatistics'):
+            baseline = getWindowStatistics(*toYearBlocks(legacyValues, legacyDates), pBaseline, pTopK, pPercentiles)
+            target = getWindowStatistics(*toYearBlocks(futureValues, futureDates), pTarget, pTopK, pPercentiles)
+            statistics = compareClimateStatistics(baseline, target)
+
+        # Every statistic is a (variable x location) array.
+        chunks.append(pd.DataFrame({f"{variable}_{name}": values[index] for name, values in statistics.items() for index, variable in enumerate(variables)}))
+
+    result = pd.concat(chunks, ignore_index=True) if len(chunks) > 0 else pd.DataFrame()
+    result.index = pLocations.index[:len(result)]
+    return result
@@ -0,0 +1,75 @@
+# Settings of Everland. They get read on every call, so they can be changed at runtime (e.g. 'config.seaLevelRise = 1.0').
+
+
+
+# Changes in rain fall percentage are allowed in an intervall from -50% to 50%.
+allowedDeviationPercentageOfRain = 50
+# Changes in temerature percentage are allowed in an intervall from -20% to 20%.
+allowedDeviationPercentageOfTemp = 20
+# Changes in windspeed percentage are allowed in an intervall from -20% to 20%.
+allowedDeviationPercentageOfWind = 20
+# The worst case increse of the sea level.
+seaLevelRise = 0.5
+# First and last year of the past climate (Open-Meteo archive, from 1940) and of the future climate (CMIP6 projections, up to 2050), which get compared.
+# The medians of the ten highest values get averaged over the years of a window, e.g. (1991, 2020) and (2041, 2050).
+# The stored climate metrics ('climateMetricsFile') are versioned by the windows, so changing them queries the locations again.
+baselineYears = (2020, 2020)
+targetYears = (2050, 2050)
+# CMIP6 model of the Open-Meteo climate api for the future climate.
+climateModel = 'MRI_AGCM3_2_S'
+# All CMIP6 models of the climate api. In the ensemble mode, they get queried in the same request and compared with each other.
+climateModels = ['CMCC_CM2_VHR4', 'FGOALS_f3_H', 'HiRAM_SIT_HR', 'MRI_AGCM3_2_S', 'EC_Earth3P_HR', 'MPI_ESM1_2_XR', 'NICAM16_8S']
+# Also check the locations with the ensemble of all 'climateModels'.
+climateEnsemble = False
+# Minimum share of the models, which have to agree on the direction of a change (or on a location being livable).
+ensembleAgreement = 2 / 3
+# NetCDF file with the daily max temperatures (CMIP6) from 2020 to 2050.
+temperatureDataFile = 'temperatur-data/data-temps.nc'
+# Urls of the Open-Meteo archive (past weather), climate (CMIP6 projections), elevation and geocoding apis.
+archiveApi = "https://archive-api.open-meteo.com/v1/archive"
+climateApi = "https://climate-api.open-meteo.com/v1/climate"
+meteoElevationApi = "https://api.open-meteo.com/v1/elevation"
+geocodingApi = "https://geocoding-api.open-meteo.com/v1/search"
+# Url of the public open-elevation api.
+openElevationApi = "https://api.open-elevation.com/api/v1/lookup"
+# Url of the local opentopodata api. IP here is a docker host on the local network.
+localElevationApi = "http://10.0.12.227:5000/v1/test-dataset"
+# Maximum number of locations per request to the local api (opentopodata's 'max_locations_per_request').
+localElevationBatchSize = 100
+# Folder with the SRTM/GeoTIFF tiles the opentopodata container serves. If it holds tiles, elevations get read in-process.
+demFolder = './opentopodata/data/test-dataset'
+# Maximum number of locations per request to the Open-Meteo archive and climate apis.
+climateBatchSize = 50
+# Maximum number of requests in flight per host for the async livability check.
+maxRequestsPerHost = 8
+# SQLite file, which caches derived results (elevation, temperature change, climate medians) per coordinate. None disables it.
+resultCacheFile = '.results.sqlite'
+# Maximum number of cached results. The least recently used ones get removed first.
+resultCacheMaxEntries = 5000000
+# Number of decimals the coordinates get rounded to in the cache keys.
+resultCacheDigits = 4
+# Natural Earth country polygons, used to aggregate results per country.
+countriesFile = './geojson/ne_110m_admin_0_countries.geojson'
+# Resolution of the rasterized country grid in degrees.
+countryGridResolution = 0.1
+# Opendatasoft api of the GeoNames cities with a population of more than 1000.
+citiesApi = "https://public.opendatasoft.com/api/explore/v2.1/catalog/datasets/geonames-all-cities-with-a-population-1000"
+# The records api only returns the first 10000 records (offset + limit), use 'iterCities' for more.
+citiesMaxOffset = 10000
+# Folder with the offline gazetteer (built from a GeoNames dump with 'everland geocode --build') and the answers of the geocoding api.
+gazetteerFolder = './gazetteer'
+# Folder with the tile pyramids of the flood maps ('everland plot --mode tiles'), one subfolder per scale. The html files load them relative to './html'.
+tileFolder = './html/tiles'
+# Highest zoom level of the tile pyramids. Every level has four times the tiles of the one before.
+tileMaxZoom = 6
+# Processes, which render the tiles. None uses one per CPU.
+tileWorkers = None
+# CSV file, which stores the climate percentage changes and the elevation per location, so other thresholds can be tested offline.
+climateMetricsFile = './geojson/climateMetrics.csv'
+# File, which gets one JSON summary (timings and counters) appended per run. None disables it.
+runSummaryFile = './runs.jsonl'
+# Minimum number of seconds between two progress messages.
+progressInterval = 2.0
+# SQLite file of the http cache of the Open-Meteo client and the number of seconds its responses stay valid.
+httpCacheFile = '.cache'
+httpCacheExpiry = 3600
@@ -0,0 +1,153 @@
+import json
+import os
+from everland import config
+from everland.results import classifyCells, loadSweepData
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+
+
+# Rasterized country grid. Gets filled by 'loadCountryGrid'.
+countryGrid = None
+
+
+
+# Rasterizes the country polygons to a grid of country ids (-1 = no country), with one cell per 'pResolution' degrees.
+# Every cell gets the country, which contains the center of the cell (even-odd rule, so holes work as well).
+def rasterizeCountries(pFile, pResolution):
+    with open(pFile, 'r', encoding='utf-8') as f:
+        features = json.load(f)['features']
+
+    rows = int(round(180 / pResolution))
+    cols = int(round(360 / pResolution))
+    grid = np.full((rows, cols), -1, dtype=np.int16)
+    names = []
+
+    for countryId, feature in enumerate(features):
+        names.append(feature['properties'].get('name'))
+        geometry = feature['geometry']
+        polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+
+        # All edges of all rings of the country as arrays of start and end points.
+        rings = [np.asarray(ring, dtype=float)[:, :2] for polygon in polygons for ring in polygon]
+        starts = np.concatenate([ring[:-1] for ring in rings])
+        ends = np.concatenate([ring[1:] for ring in rings])
+
+        # Only work on the part of the grid, which is covered by the country.
+        allPoints = np.concatenate(rings)
+        rowMin = max(0, int(np.floor((90 - allPoints[:, 1].max()) / pResolution)))
+        rowMax = min(rows, int(np.ceil((90 - allPoints[:, 1].min()) / pResolution)))
+        colMin = max(0, int(np.floor((allPoints[:, 0].min() + 180) / pResolution)))
+        colMax = min(cols, int(np.ceil((allPoints[:, 0].max() + 180) / pResolution)))
+        if rowMax <= rowMin or colMax <= colMin:
+            continue
+
+        # Pair every edge with every grid row its latitude range spans.
+        firstRow = np.ceil((90 - np.maximum(starts[:, 1], ends[:, 1])) / pResolution - 0.5).astype(int)
+        lastRow = np.floor((90 - np.minimum(starts[:, 1], ends[:, 1])) / pResolution - 0.5).astype(int)
+        counts = np.maximum(lastRow - firstRow + 1, 0)
+        edges = np.repeat(np.arange(len(starts)), counts)
+        edgeRows = np.repeat(firstRow, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+
+        # Latitude of the row centers and the longitude, where each edge crosses it.
+        y = 90 - (edgeRows + 0.5) * pResolution
+        y1, y2 = starts[edges, 1], ends[edges, 1]
+        x1, x2 = starts[edges, 0], ends[edges, 0]
+        crossing = (y1 > y) != (y2 > y)
+        x = x1[crossing] + (y[crossing] - y1[crossing]) * (x2[crossing] - x1[crossing]) / (y2[crossing] - y1[crossing])
+
+        # Every crossing toggles the 'inside' state for all cells east of it, so the parity of the running sum is the result.
+        toggles = np.zeros((rowMax - rowMin, colMax - colMin + 1), dtype=np.int32)
+        crossingCols = np.clip(np.floor((x + 180) / pResolution - 0.5).astype(int) + 1 - colMin, 0, colMax - colMin)
+        np.add.at(toggles, (np.clip(edgeRows[crossing], rowMin, rowMax - 1) - rowMin, crossingCols), 1)
+        inside = (np.cumsum(toggles, axis=1)[:, :-1] % 2) == 1
+
+        # Don't overwrite cells of countries, which were rasterized before.
+        window = grid[rowMin:rowMax, colMin:colMax]
+        window[inside & (window == -1)] = countryId
+
+    return grid, np.array(names, dtype=object)
+
+
+
+# Loads the country grid of the Natural Earth polygons. It gets rasterized once and then read from a '.npz' file.
+def loadCountryGrid(pFile=None, pResolution=None):
+    global countryGrid
+
+    if pFile is None:
+        pFile = config.countriesFile
+    if pResolution is None:
+        pResolution = config.countryGridResolution
+
+    # Reuse the grid, if it was already loaded.
+    if countryGrid is not None and countryGrid['file'] == pFile and countryGrid['resolution'] == pResolution:
+        return countryGrid
+
+    gridFile = f"{os.path.splitext(pFile)[0]}_grid{pResolution}.npz"
+    if os.path.exists(gridFile) and os.path.getmtime(gridFile) >= os.path.getmtime(pFile):
+        with np.load(gridFile, allow_pickle=True) as data:
+            grid, names = data['grid'], data['names']
+    else:
+        grid, names = rasterizeCountries(pFile, pResolution)
+        np.savez_compressed(gridFile, grid=grid, names=names)
+
+    countryGrid = {'file': pFile, 'resolution': pResolution, 'grid': grid, 'names': names}
+
+    return countryGrid
+
+
+
+# Assigns many coordinates to their countries at once. Returns the country ids (-1 = no country) and the country names.
+def assignCountries(pLats, pLongs):
+    grid = loadCountryGrid()
+    resolution = grid['resolution']
+
+    rows = np.clip(np.floor((90 - np.asarray(pLats, dtype=float)) / resolution).astype(int), 0, grid['grid'].shape[0] - 1)
+    cols = np.clip(np.floor((np.asarray(pLongs, dtype=float) + 180) / resolution).astype(int), 0, grid['grid'].shape[1] - 1)
+    countryIds = grid['grid'][rows, cols]
+
+    return countryIds, np.where(countryIds >= 0, grid['names'][np.maximum(countryIds, 0)], None)
+
+
+
+# Aggregates a sweep result per country: share of land cells, which get flooded or fail the temperature check.
+# If cities (e.g. from 'checkLivableBatch' joined with 'getCities') are given, their population is summed up as well.
+def aggregateByCountry(pSweepFile, pCities=None):
+    cells = loadSweepData(pSweepFile)
+    classes = classifyCells(cells)
+    countryIds, _ = assignCountries(cells['latitude'].to_numpy(float), cells['longitude'].to_numpy(float))
+    names = loadCountryGrid()['names']
+
+    # Only land cells inside of a country count.
+    land = (classes > 0) & (countryIds >= 0)
+    landCells = np.bincount(countryIds[land], minlength=len(names))
+    flooded = np.bincount(countryIds[land & (classes == 1)], minlength=len(names))
+    tooHot = np.bincount(countryIds[land & (classes == 2)], minlength=len(names))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = pd.DataFrame({
+            'country': names,
+            'cells': landCells,
+            'floodedShare': flooded / landCells,
+            'temperatureShare': tooHot / landCells
+        })
+
+    if pCities is not None:
+        missing = [column for column in ['latitude', 'longitude', 'population'] if column not in pCities]
+        if len(missing) > 0 or ('livable' not in pCities and 'aboveSea' not in pCities):
+            raise ValueError(f"The cities need the columns latitude, longitude, population and livable or aboveSea (e.g. from 'checkLivableBatch'), missing: {', '.join(missing) or 'livable/aboveSea'}")
+
+        cityIds, _ = assignCountries(pCities['latitude'].to_numpy(float), pCities['longitude'].to_numpy(float))
+        population = pCities['population'].to_numpy(float)
+        # A city is affected, if it won't be livable (or, without the livability check, if it gets flooded).
+        affected = ~pCities['livable'].fillna(False).to_numpy(bool) if 'livable' in pCities else ~pCities['aboveSea'].fillna(False).to_numpy(bool)
+        inCountry = cityIds >= 0
+
+        result['population'] = np.bincount(cityIds[inCountry], weights=population[inCountry], minlength=len(names))
+        result['affectedPopulation'] = np.bincount(cityIds[inCountry & affected], weights=population[inCountry & affected], minlength=len(names))
+
+    # Only keep countries with land cells (or cities).
+    keep = (result['cells'] > 0) | (result['population'] > 0 if 'population' in result else False)
+    return result[keep].sort_values('country').reset_index(drop=True)
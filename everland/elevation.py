@@ -0,0 +1,486 @@
+import logging
+import time
+import os
+import threading
+import re
+from everland import config
+from everland.cache import getCachedResults, getResultCacheVersion, putCachedResults
+from everland.sessions import getElevationSession
+from everland.stats import countEvent, timeStage
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+
+logger = logging.getLogger(__name__)
+
+
+
+# Opened DEM tiles. Gets filled by 'loadDemTiles'.
+demTiles = None
+
+
+
+def isStillAboveSeaLevelCordsMeteo(pLat, pLong):
+    # Query Open-Meteos elevation api. A failed lookup returns NaN (and is therefore not above sea level).
+    elevation = float(meteoElevation.lookup([pLat], [pLong])[0])
+
+    return (elevation - config.seaLevelRise > 1.0), elevation
+
+
+
+# Function to check if a given elevation is still above sea level
+def isStillAboveSeaLevelElevation(pElevation, seaLevelRise=0):
+    # Check if the elevation minus sea level rise is greater than 1 meter
+    return (pElevation - seaLevelRise > 1)
+
+
+
+# Function to get elevation using brute force method
+def bruteforceElevation(pLat, pLong):
+    # Query the default backend, so the lookup is rate-limited and cached. A failed lookup returns NaN.
+    return float(getElevationProvider().lookup([pLat], [pLong])[0])
+
+
+
+# Function to check if a given location is still above sea level
+def isStillAboveSeaLevelCordsLocal(pLat, pLong):
+    # Query the local api for this single location.
+    elevation = float(localElevation.lookup([pLat], [pLong])[0])
+
+    # Compare elevation with sea level rise threshold
+    isStillAboveSeaLevel = (elevation - config.seaLevelRise > 1.0)
+    
+    return isStillAboveSeaLevel, elevation
+
+
+
+# Reads the position and resolution of a single DEM tile (SRTM .hgt or GeoTIFF) and opens its data lazily.
+def openDemTile(pFile):
+    name = os.path.basename(pFile)
+    match = re.match(r'([NS])(\d+)([EW])(\d+)\.hgt$', name, re.IGNORECASE)
+
+    if match:
+        # SRTM tiles are raw big-endian int16 squares, named after their south west corner.
+        lat = int(match.group(2)) * (1 if match.group(1).upper() == 'N' else -1)
+        lon = int(match.group(4)) * (1 if match.group(3).upper() == 'E' else -1)
+        size = int(round(np.sqrt(os.path.getsize(pFile) / 2)))
+
+        return {
+            'data': np.memmap(pFile, dtype='>i2', mode='r', shape=(size, size)),
+            # The first row lies on the northern edge, the first column on the western edge.
+            'originLat': lat + 1,
+            'originLon': lon,
+            'resLat': 1 / (size - 1),
+            'resLon': 1 / (size - 1),
+            'noData': -32768
+        }
+
+    # GeoTIFFs need rasterio, which is only imported if such tiles are used.
+    import rasterio
+
+    with rasterio.open(pFile) as dataset:
+        transform = dataset.transform
+        data = dataset.read(1)
+        noData = dataset.nodata
+
+    return {
+        'data': data,
+        # GeoTIFF pixels describe areas, so move the origin to the center of the first pixel.
+        'originLat': transform.f + transform.e / 2,
+        'originLon': transform.c + transform.a / 2,
+        'resLat': -transform.e,
+        'resLon': transform.a,
+        'noData': noData
+    }
+
+
+
+# Opens all DEM tiles of the given folder and indexes them by the 1 degree cells they cover.
+def loadDemTiles(pFolder=None):
+    global demTiles
+
+    # Use the default folder, if no folder is given.
+    if pFolder is None:
+        pFolder = config.demFolder
+
+    # Reuse the tiles, if this folder was already opened.
+    if demTiles is not None and demTiles['folder'] == pFolder:
+        return demTiles
+
+    tiles = []
+    cells = {}
+
+    if pFolder is not None and os.path.isdir(pFolder):
+        for name in sorted(os.listdir(pFolder)):
+            if not name.lower().endswith(('.hgt', '.tif', '.tiff')):
+                continue
+
+            tile = openDemTile(os.path.join(pFolder, name))
+            tiles.append(tile)
+
+            # Register the tile for every 1 degree cell it touches.
+            rows, cols = tile['data'].shape
+            south = tile['originLat'] - (rows - 1) * tile['resLat']
+            east = tile['originLon'] + (cols - 1) * tile['resLon']
+            for lat in range(int(np.floor(south)), int(np.ceil(tile['originLat']))):
+                for lon in range(int(np.floor(tile['originLon'])), int(np.ceil(east))):
+                    cells.setdefault((lat, lon), []).append(len(tiles) - 1)
+
+    demTiles = {'folder': pFolder, 'tiles': tiles, 'cells': cells}
+
+    return demTiles
+
+
+
+# Checks, whether there are any DEM tiles for the in-process elevation lookup.
+def hasDemTiles():
+    return len(loadDemTiles()['tiles']) > 0
+
+
+
+# Samples a single DEM tile at the given coordinates. Coordinates outside of the tile return NaN.
+def sampleDemTile(pTile, pLats, pLongs, pMethod='bilinear'):
+    data = pTile['data']
+    rows, cols = data.shape
+
+    # Position of the coordinates inside the tile, in (fractional) pixels.
+    row = (pTile['originLat'] - pLats) / pTile['resLat']
+    col = (pLongs - pTile['originLon']) / pTile['resLon']
+    inside = (row >= -0.5) & (row <= rows - 0.5) & (col >= -0.5) & (col <= cols - 0.5)
+
+    if pMethod == 'nearest':
+        rowIndex = np.clip(np.rint(row), 0, rows - 1).astype(int)
+        colIndex = np.clip(np.rint(col), 0, cols - 1).astype(int)
+        values = data[rowIndex, colIndex].astype(float)
+        valid = values != pTile['noData']
+    else:
+        # Use the upper left pixel of the 2x2 block around each coordinate and weight the four pixels by distance.
+        row0 = np.clip(np.floor(row), 0, rows - 2).astype(int)
+        col0 = np.clip(np.floor(col), 0, cols - 2).astype(int)
+        rowWeight = np.clip(row - row0, 0, 1)
+        colWeight = np.clip(col - col0, 0, 1)
+
+        topLeft = data[row0, col0].astype(float)
+        topRight = data[row0, col0 + 1].astype(float)
+        bottomLeft = data[row0 + 1, col0].astype(float)
+        bottomRight = data[row0 + 1, col0 + 1].astype(float)
+
+        values = (topLeft * (1 - rowWeight) * (1 - colWeight) + topRight * (1 - rowWeight) * colWeight
+                  + bottomLeft * rowWeight * (1 - colWeight) + bottomRight * rowWeight * colWeight)
+        # A single void pixel makes the interpolated value useless.
+        valid = ((topLeft != pTile['noData']) & (topRight != pTile['noData'])
+                 & (bottomLeft != pTile['noData']) & (bottomRight != pTile['noData']))
+
+    return np.where(inside & valid, values, np.nan)
+
+
+
+# Looks up the elevation of many coordinates at once from the local DEM tiles.
+# Coordinates without any tile (e.g. open sea for SRTM) get 'pFillValue'.
+def getElevationsDem(pLats, pLongs, pMethod='bilinear', pFillValue=float('nan')):
+    tiles = loadDemTiles()
+
+    lats = np.atleast_1d(np.asarray(pLats, dtype=float))
+    longs = np.atleast_1d(np.asarray(pLongs, dtype=float))
+    elevations = np.full(len(lats), np.nan)
+    covered = np.zeros(len(lats), dtype=bool)
+
+    # Group the coordinates by their 1 degree cell, so every tile gets sampled once per call.
+    cellLats = np.floor(lats).astype(int)
+    cellLongs = np.floor(longs).astype(int)
+    cellKeys, cellIndex = np.unique(np.stack([cellLats, cellLongs], axis=1), axis=0, return_inverse=True)
+    cellIndex = cellIndex.ravel()
+    cellPoints = np.split(np.argsort(cellIndex, kind='stable'), np.cumsum(np.bincount(cellIndex))[:-1])
+
+    for (cellLat, cellLong), points in zip(cellKeys, cellPoints):
+        for tileIndex in tiles['cells'].get((int(cellLat), int(cellLong)), []):
+            # Only sample the coordinates of this cell, which don't have an elevation yet.
+            points = points[np.isnan(elevations[points])]
+            if len(points) == 0:
+                break
+
+            covered[points] = True
+            elevations[points] = sampleDemTile(tiles['tiles'][tileIndex], lats[points], longs[points], pMethod)
+
+    # Coordinates outside of all tiles
+    elevations[~covered] = pFillValue
+
+    return elevations
+
+
+
+# Checks for many coordinates at once, whether they are still above sea level, using the local DEM tiles.
+def isStillAboveSeaLevelDem(pLats, pLongs, pFillValue=float('nan')):
+    elevations = getElevationsDem(pLats, pLongs, pFillValue=pFillValue)
+    return (elevations - config.seaLevelRise > 1.0), elevations
+
+
+
+# Function to check if a given location is still above sea level, using the local DEM tiles
+def isStillAboveSeaLevelCordsDem(pLat, pLong):
+    above, elevations = isStillAboveSeaLevelDem([pLat], [pLong])
+    return bool(above[0]), float(elevations[0])
+
+
+
+# Limits the request rate of an api with a token bucket: 'pRate' requests per second with bursts of up to 'pCapacity' requests.
+class TokenBucket:
+    def __init__(self, pRate, pCapacity=None):
+        self.rate = pRate
+        self.capacity = pCapacity if pCapacity is not None else max(1.0, pRate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Blocks until the given number of tokens is available and takes them.
+    def acquire(self, pTokens=1):
+        while True:
+            with self.lock:
+                # Refill the bucket according to the time passed since the last call.
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= pTokens:
+                    self.tokens -= pTokens
+                    return
+
+                wait = (pTokens - self.tokens) / self.rate
+
+            with timeStage('rateLimitSleep'):
+                time.sleep(wait)
+
+    # The lock can't be pickled, so a bucket sent to a worker process starts full with the same rate.
+    def __getstate__(self):
+        return {'rate': self.rate, 'capacity': self.capacity}
+
+    def __setstate__(self, pState):
+        self.__init__(pState['rate'], pState['capacity'])
+
+
+
+# Base class of all elevation backends. Subclasses implement 'fetch' for a single batch.
+class ElevationProvider:
+    # Name of the provider (used in messages and cache keys).
+    name = 'elevation'
+    # Maximum number of locations per request.
+    batchSize = 100
+    # Maximum number of requests per second.
+    rate = 1.0
+    # Version of the provider's dataset (used in cache keys).
+    version = '1'
+
+    def __init__(self, pRate=None, pBatchSize=None):
+        if pBatchSize is not None:
+            self.batchSize = pBatchSize
+        self.fullRate = pRate if pRate is not None else self.rate
+        self.bucket = TokenBucket(self.fullRate)
+
+    # Returns the elevations of a single batch of locations. Locations without data are NaN, errors get raised.
+    def fetch(self, pLats, pLongs):
+        raise NotImplementedError
+
+    # Reduces the request rate to its share, if 'pShares' processes use the same api (e.g. the workers of the parallel sweep).
+    def splitRate(self, pShares):
+        if self.fullRate != float('inf'):
+            self.bucket = TokenBucket(self.fullRate / pShares)
+
+    # Returns the elevations of any number of locations. Locations which failed or have no data are NaN.
+    def lookup(self, pLats, pLongs):
+        lats = np.atleast_1d(np.asarray(pLats, dtype=float))
+        longs = np.atleast_1d(np.asarray(pLongs, dtype=float))
+
+        # Use the cached elevations and only query the locations, which weren't queried before.
+        version = getResultCacheVersion(self.name, self.version)
+        elevations = np.array([np.nan if value is None else value for value in getCachedResults('elevation', lats, longs, version)], dtype=float)
+        missing = np.flatnonzero(np.isnan(elevations))
+
+        # Split the locations into chunks the api accepts in a single request.
+        for start in range(0, len(missing), self.batchSize):
+            chunk = missing[start:start + self.batchSize]
+
+            # Wait until the rate limit allows another request.
+            self.bucket.acquire()
+            try:
+                with timeStage(f"elevation.{self.name}"):
+                    elevations[chunk] = self.fetch(lats[chunk], longs[chunk])
+            except Exception as e:
+                # Leave the batch marked as failed (NaN), so a fallback can take care of it.
+                countEvent(f"elevation.{self.name}.failures", len(chunk))
+                logger.warning("Elevation lookup with '%s' failed for %d locations: %s", self.name, len(chunk), e)
+
+        # Save the new elevations for the next time. Failed lookups don't get cached.
+        found = missing[~np.isnan(elevations[missing])]
+        putCachedResults('elevation', lats[found], longs[found], version, elevations[found].tolist())
+
+        return elevations
+
+
+
+# Reads the elevations in-process from the local DEM tiles.
+# Locations without any tile get 'pFillValue'. NaN passes them on to the next provider, because a missing tile can also be
+# a gap of the dataset or a tile, which isn't in the folder.
+class DemElevationProvider(ElevationProvider):
+    name = 'dem'
+
+    def __init__(self, pMethod='bilinear', pFillValue=float('nan')):
+        super().__init__(pRate=float('inf'), pBatchSize=1)
+        self.method = pMethod
+        self.fillValue = pFillValue
+
+    # The dataset is the tile folder.
+    @property
+    def version(self):
+        return config.demFolder
+
+    def fetch(self, pLats, pLongs):
+        return getElevationsDem(pLats, pLongs, pMethod=self.method, pFillValue=self.fillValue)
+
+    # The tiles are sampled for all locations at once and don't need any rate limit.
+    # Only a tile, which can't be read, leaves the locations NaN for a fallback.
+    def lookup(self, pLats, pLongs):
+        try:
+            with timeStage(f"elevation.{self.name}"):
+                return self.fetch(pLats, pLongs)
+        except Exception as e:
+            count = len(np.atleast_1d(pLats))
+            countEvent(f"elevation.{self.name}.failures", count)
+            logger.warning("Elevation lookup with '%s' failed for %d locations: %s", self.name, count, e)
+            return np.full(count, np.nan)
+
+
+
+# Queries the local opentopodata api.
+class LocalElevationProvider(ElevationProvider):
+    name = 'local'
+    rate = 50.0
+
+    def __init__(self, pUrl=None, pRate=None, pBatchSize=None):
+        super().__init__(pRate, pBatchSize if pBatchSize is not None else config.localElevationBatchSize)
+        self.url = pUrl if pUrl is not None else config.localElevationApi
+        # The dataset is part of the url.
+        self.version = self.url
+
+    def fetch(self, pLats, pLongs):
+        # opentopodata expects the locations pipe-separated: 'lat,lon|lat,lon|...'
+        locations = "|".join(f"{lat},{lon}" for lat, lon in zip(pLats, pLongs))
+
+        # Send a GET request to the API (reusing the pooled connections) and parse the JSON response
+        response = getElevationSession().get(self.url, params={"locations": locations}, timeout=30)
+        response.raise_for_status()
+
+        # The results are returned in the order of the requested locations.
+        return np.array([result['elevation'] for result in response.json()['results']], dtype=float)
+
+
+
+# Queries Open-Meteos elevation api.
+class MeteoElevationProvider(ElevationProvider):
+    name = 'meteo'
+    rate = 5.0
+    version = 'copernicus-dem90'
+
+    def fetch(self, pLats, pLongs):
+        # Open-Meteo expects comma-separated lists of latitudes and longitudes.
+        params = {
+            "latitude": ",".join(str(lat) for lat in pLats),
+            "longitude": ",".join(str(lon) for lon in pLongs)
+        }
+
+        response = getElevationSession().get(config.meteoElevationApi, params=params, timeout=30)
+        response.raise_for_status()
+
+        return np.array(response.json()['elevation'], dtype=float)
+
+
+
+# Queries the public open-elevation api.
+class OpenElevationProvider(ElevationProvider):
+    name = 'open-elevation'
+    rate = 1.0
+    version = 'srtm'
+
+    def fetch(self, pLats, pLongs):
+        # open-elevation accepts many locations as a JSON body.
+        body = {"locations": [{"latitude": float(lat), "longitude": float(lon)} for lat, lon in zip(pLats, pLongs)]}
+
+        response = getElevationSession().post(config.openElevationApi, json=body, timeout=30)
+        response.raise_for_status()
+
+        return np.array([result['elevation'] for result in response.json()['results']], dtype=float)
+
+
+
+# Asks a list of providers in order. Only the locations, which are still missing, get passed on to the next one.
+class FallbackElevationProvider(ElevationProvider):
+    name = 'fallback'
+
+    def __init__(self, pProviders):
+        super().__init__(pRate=float('inf'))
+        self.providers = pProviders
+
+    def fetch(self, pLats, pLongs):
+        return self.lookup(pLats, pLongs)
+
+    def splitRate(self, pShares):
+        for provider in self.providers:
+            provider.splitRate(pShares)
+
+    def lookup(self, pLats, pLongs):
+        lats = np.atleast_1d(np.asarray(pLats, dtype=float))
+        longs = np.atleast_1d(np.asarray(pLongs, dtype=float))
+        elevations = np.full(len(lats), np.nan)
+
+        for provider in self.providers:
+            missing = np.flatnonzero(np.isnan(elevations))
+            if len(missing) == 0:
+                break
+
+            elevations[missing] = provider.lookup(lats[missing], longs[missing])
+
+        return elevations
+
+
+
+# Returns the default elevation backend: local DEM tiles (if available), then the local api, Open-Meteo and open-elevation.
+def getElevationProvider():
+    global elevationProvider
+
+    if elevationProvider is None:
+        providers = [localElevation, meteoElevation, openElevation]
+        if hasDemTiles():
+            providers.insert(0, demElevation)
+        elevationProvider = FallbackElevationProvider(providers)
+
+    return elevationProvider
+
+
+
+# Describes an elevation backend (by default 'getElevationProvider') by its providers and their datasets in the order they get asked.
+# Results, which keep elevations (e.g. the sweep store or the climate metrics), are versioned by it.
+def getElevationBackendVersion(pProvider=None):
+    if pProvider is None:
+        pProvider = getElevationProvider()
+
+    return [[provider.name, provider.version] for provider in getattr(pProvider, 'providers', [pProvider])]
+
+
+
+# Checks for many coordinates at once, whether they are still above sea level.
+# Failed lookups have a NaN elevation and are not above sea level.
+def isStillAboveSeaLevel(pLats, pLongs, pProvider=None):
+    if pProvider is None:
+        pProvider = getElevationProvider()
+
+    elevations = pProvider.lookup(pLats, pLongs)
+    return (elevations - config.seaLevelRise > 1.0), elevations
+
+
+
+# Shared instances of the elevation backends, so their rate limits apply to the whole program.
+demElevation = DemElevationProvider()
+localElevation = LocalElevationProvider()
+meteoElevation = MeteoElevationProvider()
+openElevation = OpenElevationProvider()
+# Default backend, gets built by 'getElevationProvider'.
+elevationProvider = None
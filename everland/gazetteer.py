@@ -0,0 +1,342 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from everland import config
+from everland.stats import countEvent, timeStage
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+requests = LazyModule('requests')
+
+
+
+# Opened gazetteer index (memory-mapped arrays and the answers of the remote api). Gets filled by 'loadGazetteer'.
+gazetteer = None
+gazetteerLock = threading.Lock()
+
+# Number of bytes of a name, which are kept for the prefix search. Longer names are still found by their hash.
+gazetteerKeyWidth = 48
+# Columns of the places table and their types.
+gazetteerColumns = {'name': 'S64', 'latitude': 'float32', 'longitude': 'float32', 'population': 'int64', 'country': 'S2'}
+
+
+
+# Byte table for ascii names: letters and digits stay, all other characters become spaces (apostrophes get removed before).
+asciiNameTable = bytes(character if chr(character).isalnum() else 32 for character in range(128)) + bytes([32] * 128)
+# The same for the vectorized normalization: lower case letters and digits, spaces for the other characters, 0 for apostrophes (and the padding).
+asciiCodeTable = [ord(chr(character).lower()) if chr(character).isalnum() else (0 if chr(character) in "\0'`" else 32) for character in range(128)]
+# Number of names, which get normalized at once (the character matrix of a block is names x longest name).
+normalizeBlockSize = 65536
+
+
+
+# Normalizes a place name for the lookup: without accents and punctuation, lower case and single spaces ("Sana'a" -> "sanaa").
+def normalizeName(pName):
+    name = str(pName)
+    # Most names are plain ascii and don't need the (much slower) unicode normalization.
+    if name.isascii():
+        return b' '.join(name.encode('ascii').translate(asciiNameTable, b"'`").lower().split()).decode('ascii')
+
+    name = re.sub(r'[\u0300-\u036f]', '', unicodedata.normalize('NFKD', name))
+    name = re.sub(r"['’`]", '', name.casefold())
+    return re.sub(r'[\W_]+', ' ', name).strip()
+
+
+
+# Moves the kept characters of every row of a character matrix to the left, the rest of the row gets zeros.
+# Only the rows, which lose characters in the middle, have to be moved.
+def compactRows(pCharacters, pKeep):
+    compact = np.where(pKeep, pCharacters, 0).astype(pCharacters.dtype)
+    # A row has to be moved, if a gap comes before its last kept character.
+    lastKept = pKeep.shape[1] - 1 - np.argmax(pKeep[:, ::-1], axis=1)
+    changed = np.flatnonzero(pKeep.any(axis=1) & (np.argmax(~pKeep, axis=1) < lastKept))
+    if len(changed) == 0:
+        return compact
+
+    rows, columns = np.nonzero(pKeep[changed])
+    counts = np.count_nonzero(pKeep[changed], axis=1)
+    targets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    compact[changed] = 0
+    compact[changed[rows], targets] = pCharacters[changed[rows], columns]
+    return compact
+
+
+
+# Normalizes many names at once like 'normalizeName' and returns them utf-8 encoded (as bytes array).
+# Ascii names get normalized as one character matrix, only the others one by one.
+def normalizeNames(pNames):
+    names = np.asarray(pNames, dtype=str).reshape(-1)
+    if len(names) > normalizeBlockSize:
+        return np.concatenate([normalizeNames(names[start:start + normalizeBlockSize]) for start in range(0, len(names), normalizeBlockSize)])
+    if len(names) == 0 or names.dtype.itemsize == 0:
+        return np.zeros(len(names), dtype='S1')
+
+    codes = names.view(np.uint32).reshape(len(names), -1)
+    characters = np.array(asciiCodeTable, dtype=np.uint8)[np.minimum(codes, 127)]
+
+    # Remove the apostrophes, then runs of spaces (and spaces at the start) become single spaces.
+    characters = compactRows(characters, characters != 0)
+    previous = np.pad(characters[:, :-1], ((0, 0), (1, 0)), constant_values=32)
+    characters = compactRows(characters, (characters != 0) & ((characters != 32) | (previous != 32)))
+    # Remove a space at the end.
+    length = np.count_nonzero(characters, axis=1)
+    ending = np.flatnonzero((length > 0) & (characters[np.arange(len(characters)), np.maximum(length - 1, 0)] == 32))
+    characters[ending, length[ending] - 1] = 0
+
+    keys = np.ascontiguousarray(characters).view(f"S{characters.shape[1]}").reshape(-1)
+    other = np.flatnonzero((codes >= 128).any(axis=1))
+    if len(other) > 0:
+        encoded = [normalizeName(name).encode('utf-8') for name in names[other]]
+        keys = keys.astype(f"S{max(characters.shape[1], max(map(len, encoded)), 1)}")
+        keys[other] = encoded
+
+    return keys
+
+
+
+# Decodes utf-8 encoded names (a bytes array) to strings. Ascii names get decoded all at once.
+def decodeNames(pNames):
+    names = np.asarray(pNames)
+    if len(names) == 0 or names.dtype.itemsize == 0:
+        return np.full(len(names), '', dtype=object)
+
+    data = names.view(np.uint8).reshape(len(names), -1)
+    decoded = data.astype(np.uint32).view(f"U{data.shape[1]}").reshape(-1).astype(object)
+    other = np.flatnonzero((data >= 128).any(axis=1))
+    # Names, which got shortened in the middle of a character, lose this character.
+    decoded[other] = [name.decode('utf-8', 'ignore') for name in names[other]]
+
+    return decoded
+
+
+
+# Hashes normalized names (the bytes array of 'normalizeNames') to 64 bit numbers (FNV-1a), which get looked up with a binary search.
+# All names get hashed at once, one byte column after the other.
+def hashNames(pKeys):
+    keys = np.asarray(pKeys, dtype=bytes)
+    if len(keys) == 0 or keys.dtype.itemsize == 0:
+        return np.full(len(keys), 0xcbf29ce484222325, dtype=np.uint64)
+
+    data = keys.view(np.uint8).reshape(len(keys), -1)
+    hashes = np.full(len(keys), 0xcbf29ce484222325, dtype=np.uint64)
+    prime = np.uint64(0x100000001b3)
+    for column in range(data.shape[1]):
+        # The names are padded with zero bytes, which must not change the hash.
+        byte = data[:, column]
+        hashes = np.where(byte != 0, (hashes ^ byte) * prime, hashes)
+
+    return hashes
+
+
+
+# Builds the gazetteer index from a GeoNames dump (e.g. 'cities1000.txt' or 'allCountries.txt') and saves it as '.npy' files.
+# Every place can be found by its name and its ascii name, with 'pAlternateNames' also by all of its alternate names.
+def buildGazetteer(pFile, pFolder=None, pMinPopulation=0, pAlternateNames=False, pChunkSize=100000):
+    if pFolder is None:
+        pFolder = config.gazetteerFolder
+
+    places = {column: [] for column in gazetteerColumns}
+    keys = []
+    keyRows = []
+    count = 0
+
+    # GeoNames dumps are tab-separated without a header: name, ascii name, alternate names, latitude, longitude, country code and population.
+    for chunk in pd.read_csv(pFile, sep='\t', header=None, usecols=[1, 2, 3, 4, 5, 8, 14], names=['name', 'asciiName', 'alternateNames', 'latitude', 'longitude', 'country', 'population'],
+                             quoting=3, chunksize=pChunkSize, dtype={1: str, 2: str, 3: str, 8: str}, keep_default_na=False):
+        chunk = chunk[chunk['population'] >= pMinPopulation].reset_index(drop=True)
+
+        for column in ['latitude', 'longitude', 'population']:
+            places[column].append(chunk[column].to_numpy())
+        places['name'].append(chunk['name'].str.encode('utf-8').to_numpy().astype(gazetteerColumns['name']))
+        places['country'].append(chunk['country'].str.encode('utf-8').to_numpy().astype(gazetteerColumns['country']))
+
+        # One key per distinct normalized name of a place.
+        names = [chunk['name'], chunk['asciiName']]
+        if pAlternateNames:
+            names.append(chunk['alternateNames'].str.split(',').explode())
+        names = pd.concat(names)
+        chunkKeys = pd.DataFrame({'key': normalizeNames(names.to_numpy()), 'row': count + names.index.to_numpy()}).drop_duplicates()
+        chunkKeys = chunkKeys[chunkKeys['key'] != b'']
+        keys.append(chunkKeys['key'].to_numpy().astype(bytes))
+        keyRows.append(chunkKeys['row'].to_numpy(np.int32))
+
+        count += len(chunk)
+
+    os.makedirs(pFolder, exist_ok=True)
+    for column, dtype in gazetteerColumns.items():
+        values = np.concatenate(places[column]) if len(places[column]) > 0 else np.array([])
+        np.save(os.path.join(pFolder, f"{column}.npy"), values.astype(dtype))
+
+    keys = np.concatenate(keys) if len(keys) > 0 else np.array([], dtype='S1')
+    keyRows = np.concatenate(keyRows) if len(keyRows) > 0 else np.array([], dtype=np.int32)
+    population = np.concatenate(places['population']) if count > 0 else np.array([], dtype=np.int64)
+
+    # Hash table: sorted by hash, places with the same name by their population (the biggest one comes first).
+    hashes = hashNames(keys)
+    order = np.lexsort((-population[keyRows], hashes))
+    np.save(os.path.join(pFolder, 'hashes.npy'), hashes[order])
+    np.save(os.path.join(pFolder, 'hashRows.npy'), keyRows[order])
+
+    # Prefix index: the (shortened) names in sorted order.
+    prefixes = keys.astype(f"S{gazetteerKeyWidth}")
+    order = np.argsort(prefixes, kind='stable')
+    np.save(os.path.join(pFolder, 'keys.npy'), prefixes[order])
+    np.save(os.path.join(pFolder, 'keyRows.npy'), keyRows[order])
+
+    # The index changed, so it has to be opened again.
+    global gazetteer
+    gazetteer = None
+
+    print(f"Gazetteer: {count} places with {len(keys)} names in '{pFolder}'")
+    return pFolder
+
+
+
+# Opens the gazetteer index (memory-mapped, so only the pages of the looked up names get read) and the answers of the remote api.
+def loadGazetteer(pFolder=None):
+    global gazetteer
+
+    if pFolder is None:
+        pFolder = config.gazetteerFolder
+
+    with gazetteerLock:
+        if gazetteer is not None and gazetteer['folder'] == pFolder:
+            return gazetteer
+
+        index = {'folder': pFolder, 'additions': {}}
+        # Without a GeoNames index, only the answers of the remote api are used.
+        if os.path.exists(os.path.join(pFolder, 'hashes.npy')):
+            for name in list(gazetteerColumns) + ['hashes', 'hashRows', 'keys', 'keyRows']:
+                index[name] = np.load(os.path.join(pFolder, f"{name}.npy"), mmap_mode='r')
+
+        additionsFile = os.path.join(pFolder, 'additions.jsonl')
+        if os.path.exists(additionsFile):
+            with open(additionsFile, 'r', encoding='utf-8') as f:
+                for line in f:
+                    # Ignore a line, which was only partly written.
+                    try:
+                        addition = json.loads(line)
+                    except ValueError:
+                        continue
+                    index['additions'][addition['key']] = addition['place']
+
+        gazetteer = index
+        return gazetteer
+
+
+
+# Looks up many names at once. Returns a DataFrame (in the order of the names) with the most populous place per name.
+# Names, which aren't in the index, have no place name and no coordinates ('found' is False).
+def lookupNames(pNames, pFolder=None):
+    index = loadGazetteer(pFolder)
+    names = list(pNames)
+    count = len(names)
+
+    name = np.full(count, '', dtype=object)
+    latitude = np.full(count, np.nan)
+    longitude = np.full(count, np.nan)
+    population = np.zeros(count, dtype=np.int64)
+    country = np.full(count, '', dtype=object)
+    found = np.zeros(count, dtype=bool)
+
+    with timeStage('gazetteer'):
+        keys = normalizeNames(names)
+
+        if len(index.get('hashes', [])) > 0 and count > 0:
+            hashes = hashNames(keys)
+            # Sorted hashes read the memory-mapped table in order.
+            order = np.argsort(hashes)
+            position = np.empty(count, dtype=np.int64)
+            position[order] = np.minimum(np.searchsorted(index['hashes'], hashes[order]), len(index['hashes']) - 1)
+            found = np.asarray(index['hashes'][position]) == hashes
+            rows = np.asarray(index['hashRows'][position[found]])
+
+            name[found] = decodeNames(index['name'][rows])
+            latitude[found] = index['latitude'][rows]
+            longitude[found] = index['longitude'][rows]
+            population[found] = index['population'][rows]
+            country[found] = decodeNames(index['country'][rows])
+
+        # Answers of the remote api for names, which aren't in the GeoNames index.
+        for position in np.flatnonzero(~found):
+            place = index['additions'].get(keys[position].decode('utf-8'))
+            if place is not None:
+                name[position], latitude[position], longitude[position] = place['name'], place['latitude'], place['longitude']
+                population[position], country[position] = place.get('population') or 0, place.get('country') or ''
+                found[position] = True
+
+    countEvent('gazetteer.hits', int(found.sum()))
+    countEvent('gazetteer.misses', int(count - found.sum()))
+
+    return pd.DataFrame({'query': names, 'name': name, 'latitude': latitude, 'longitude': longitude, 'population': population, 'country': country, 'found': found})
+
+
+
+# Returns the most populous places, whose names start with the given prefix.
+def searchPrefix(pPrefix, pLimit=10, pFolder=None):
+    index = loadGazetteer(pFolder)
+    if 'keys' not in index:
+        return pd.DataFrame(columns=list(gazetteerColumns))
+
+    prefix = normalizeName(pPrefix).encode('utf-8')[:gazetteerKeyWidth]
+    # All names with the prefix are next to each other. No name contains the byte 0xff (it's not valid utf-8).
+    start = np.searchsorted(index['keys'], prefix, side='left')
+    end = np.searchsorted(index['keys'], prefix + b'\xff', side='left')
+    rows = np.unique(np.asarray(index['keyRows'][start:end]))
+    rows = rows[np.argsort(-np.asarray(index['population'][rows]), kind='stable')][:pLimit]
+
+    return pd.DataFrame({
+        'name': decodeNames(index['name'][rows]),
+        'latitude': np.asarray(index['latitude'][rows], dtype=float),
+        'longitude': np.asarray(index['longitude'][rows], dtype=float),
+        'population': np.asarray(index['population'][rows]),
+        'country': decodeNames(index['country'][rows])
+    })
+
+
+
+# Asks the Open-Meteo geocoding api for a single name. Returns None, if it doesn't know the name.
+def geocodeRemote(pName):
+    # Let requests encode the name (spaces, apostrophes, non-latin scripts).
+    response = requests.get(config.geocodingApi, params={'name': pName, 'count': 1, 'language': 'de', 'format': 'json'}, timeout=30)
+    response.raise_for_status()
+    results = response.json().get('results') or []
+
+    if len(results) == 0:
+        return None
+    return {'name': results[0].get('name', pName), 'latitude': results[0]['latitude'], 'longitude': results[0]['longitude'],
+            'population': results[0].get('population'), 'country': results[0].get('country_code')}
+
+
+
+# Looks up many names in the gazetteer index and only asks the remote api for the names it doesn't know.
+# The answers of the api (also unknown names) get written back to the index, so every name is only requested once.
+def geocodeNames(pNames, pFolder=None):
+    names = list(pNames)
+    result = lookupNames(names, pFolder)
+    index = loadGazetteer(pFolder)
+
+    answers = {}
+    for position in np.flatnonzero(~result['found'].to_numpy()):
+        key = normalizeName(names[position])
+        # Unknown names were already asked for.
+        if key == '' or key in index['additions']:
+            continue
+        if key not in answers:
+            answers[key] = geocodeRemote(names[position])
+        place = answers[key]
+        if place is not None:
+            result.loc[position, ['name', 'latitude', 'longitude', 'population', 'country', 'found']] = [place['name'], place['latitude'], place['longitude'], place.get('population') or 0, place.get('country') or '', True]
+
+    if len(answers) > 0:
+        os.makedirs(index['folder'], exist_ok=True)
+        with gazetteerLock, open(os.path.join(index['folder'], 'additions.jsonl'), 'a', encoding='utf-8') as f:
+            for key, place in answers.items():
+                f.write(json.dumps({'key': key, 'place': place}, ensure_ascii=False) + "\n")
+                index['additions'][key] = place
+
+    return result
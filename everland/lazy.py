@@ -0,0 +1,22 @@
+import importlib
+
+
+
+# Stands in for a module, which only gets imported on its first use: 'pd = LazyModule("pandas")'.
+# Importing numpy, pandas, xarray or folium takes from a tenth of a second up to seconds, while most commands
+# (and every worker process) only need some of them.
+class LazyModule:
+    def __init__(self, pName):
+        self.__dict__['moduleName'] = pName
+        self.__dict__['module'] = None
+
+    def __getattr__(self, pAttribute):
+        module = self.__dict__['module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['moduleName'])
+            self.__dict__['module'] = module
+
+        return getattr(module, pAttribute)
+
+    def __repr__(self):
+        return f"<lazy module '{self.__dict__['moduleName']}'>"
@@ -0,0 +1,422 @@
+import asyncio
+import concurrent.futures
+import os
+import urllib.parse
+import warnings
+from everland import config
+from everland.cache import getResultCacheVersion
+from everland.climate import calcPercentageIncrease, getEnsembleClimateData, getEnsembleClimateDataBatch, getFutureClimateData, getFutureClimateDataBatch, getLegacyClimateData, getLegacyClimateDataBatch
+from everland.elevation import getElevationBackendVersion, isStillAboveSeaLevel
+from everland.results import appendToCSV, evaluateSeaLevelScenarios
+from everland.stats import Progress, startRunStats, writeRunSummary
+from everland.temperature import get_temperature_data
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+
+
+# Decides, whether a location will still be livable in 2050, based on its legacy and future weather conditions and its elevation.
+# If 'pPercentageTemp' is given, it replaces the temperature change calculated from the weather conditions.
+def evaluateLivable(pLegacy, pFuture, pElevation, pPercentageTemp=None):
+    legacy_temperature_2m_max, legacy_precipitation_sum, legacy_wind_speed_10m_max = pLegacy
+    future_temperature_2m_max, future_precipitation_sum, future_wind_speed_10m_max = pFuture
+
+    # Calculate the percentage differences between the past and the future.
+    percentrageIncreaseRain = calcPercentageIncrease(legacy_precipitation_sum, future_precipitation_sum)
+    if pPercentageTemp is None:
+        pPercentageTemp = calcPercentageIncrease(legacy_temperature_2m_max, future_temperature_2m_max)
+    percentrageIncreaseWind = calcPercentageIncrease(legacy_wind_speed_10m_max, future_wind_speed_10m_max)
+
+    # Calculate, whether the given location will be flooded or not.
+    stillAboveSeaLevel = bool(pElevation - config.seaLevelRise > 1.0)
+
+    return {
+        'percentageIncreaseRain': percentrageIncreaseRain,
+        'percentageIncreaseTemp': pPercentageTemp,
+        'percentageIncreaseWind': percentrageIncreaseWind,
+        'aboveSea': stillAboveSeaLevel,
+        'elevation': float(pElevation),
+        # Livable, if no change exceeds its upper or lower bound and the location won't be flooded.
+        'livable': (abs(percentrageIncreaseRain) <= config.allowedDeviationPercentageOfRain
+                    and abs(pPercentageTemp) <= config.allowedDeviationPercentageOfTemp
+                    and abs(percentrageIncreaseWind) <= config.allowedDeviationPercentageOfWind
+                    and stillAboveSeaLevel)
+    }
+
+
+
+# Evaluates the climate changes of all models of an ensemble for many locations at once.
+# 'pLegacy' is a (location x variable) and 'pEnsemble' a (location x model x variable) array of the medians, 'pAboveSea' a (location) array.
+# Returns the ensemble mean and spread (standard deviation) of the percentage changes and, whether enough models agree on their direction,
+# and the share of the models, which keep the location livable.
+def evaluateEnsemble(pLegacy, pEnsemble, pAboveSea):
+    legacy = np.asarray(pLegacy, dtype=float)[:, None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        changes = (np.asarray(pEnsemble, dtype=float) - legacy) / legacy * 100
+    valid = ~np.isnan(changes)
+
+    # Models without data for a location get skipped.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(changes, axis=1)
+        spread = np.nanstd(changes, axis=1)
+
+    # Share of the models, which change in the same direction as the ensemble mean.
+    agreement = np.count_nonzero(valid & (np.sign(changes) == np.sign(mean)[:, None, :]), axis=1) / np.maximum(np.count_nonzero(valid, axis=1), 1)
+    # Share of the models, which keep every change within its bounds (the variables are temperature, rain and wind).
+    allowed = np.array([config.allowedDeviationPercentageOfTemp, config.allowedDeviationPercentageOfRain, config.allowedDeviationPercentageOfWind])
+    models = np.count_nonzero(valid.all(axis=2), axis=1)
+    livableShare = np.count_nonzero((np.abs(changes) <= allowed).all(axis=2), axis=1) / np.maximum(models, 1)
+
+    result = pd.DataFrame({'ensembleModels': models})
+    for index, name in enumerate(['Temp', 'Rain', 'Wind']):
+        result[f"ensembleMean{name}"] = mean[:, index].round(3)
+        result[f"ensembleSpread{name}"] = spread[:, index].round(3)
+        result[f"ensembleAgreement{name}"] = agreement[:, index] >= config.ensembleAgreement
+    result['ensembleLivableShare'] = livableShare.round(3)
+    result['ensembleLivable'] = (livableShare >= config.ensembleAgreement) & (models > 0) & np.asarray(pAboveSea, dtype=bool)
+
+    return result
+
+
+
+# Shared state of one async livability run: a semaphore per host and one thread pool for the blocking requests.
+def createPipeline(pMaxPerHost=None):
+    if pMaxPerHost is None:
+        pMaxPerHost = config.maxRequestsPerHost
+
+    return {
+        'maxPerHost': pMaxPerHost,
+        'semaphores': {},
+        # Three hosts get queried per location (archive, climate and elevation).
+        'executor': concurrent.futures.ThreadPoolExecutor(max_workers=3 * pMaxPerHost)
+    }
+
+
+
+# Runs a blocking request in the pipeline's thread pool, with at most 'maxPerHost' requests in flight for the host of the given url.
+# Requests, whose host isn't known beforehand (e.g. the elevation providers, which fall back to other apis), pass no url.
+# Their sessions limit every request by its real host (see 'sessions.limitHosts').
+async def runLimited(pPipeline, pUrl, pFunction, *pArgs):
+    if pUrl is None:
+        return await asyncio.get_running_loop().run_in_executor(pPipeline['executor'], pFunction, *pArgs)
+
+    host = urllib.parse.urlparse(pUrl).netloc
+    semaphore = pPipeline['semaphores'].setdefault(host, asyncio.Semaphore(pPipeline['maxPerHost']))
+
+    async with semaphore:
+        return await asyncio.get_running_loop().run_in_executor(pPipeline['executor'], pFunction, *pArgs)
+
+
+
+# Checks, whether a location will still be livable in 2050, with all requests of the location running concurrently.
+# With 'pEnsemble' (default: 'climateEnsemble' of the config), all models of the ensemble get queried in one more request and evaluated as well.
+async def checkLivableAsync(pLat, pLong, pUseTemperatureGrid=False, pPipeline=None, pEnsemble=None):
+    if pEnsemble is None:
+        pEnsemble = config.climateEnsemble
+
+    ownPipeline = pPipeline is None
+    if ownPipeline:
+        pPipeline = createPipeline()
+
+    try:
+        # Query the legacy (2020) and future (2050) weather conditions and the elevation at the same time.
+        queries = [
+            runLimited(pPipeline, config.archiveApi, getLegacyClimateData, pLat, pLong),
+            runLimited(pPipeline, config.climateApi, getFutureClimateData, pLat, pLong),
+            runLimited(pPipeline, None, isStillAboveSeaLevel, [pLat], [pLong])
+        ]
+        if pEnsemble:
+            queries.append(runLimited(pPipeline, config.climateApi, getEnsembleClimateData, pLat, pLong))
+        legacy, future, (_, elevations), *ensemble = await asyncio.gather(*queries)
+    finally:
+        if ownPipeline:
+            pPipeline['executor'].shutdown(wait=False)
+
+    # Read the temperature change from the precomputed NetCDF grid instead of Open-Meteo, if requested.
+    percentageTemp = get_temperature_data(pLong, pLat)[1] if pUseTemperatureGrid else None
+
+    result = evaluateLivable(legacy, future, elevations[0], percentageTemp)
+    if pEnsemble:
+        result.update(evaluateEnsemble([legacy], ensemble, [result['aboveSea']]).iloc[0].to_dict())
+
+    return result
+
+
+
+# Checks all given locations concurrently and yields '(index, result)' as soon as a location is done.
+async def streamLivable(pLocations, pUseTemperatureGrid=False, pMaxPerHost=None):
+    pipeline = createPipeline(pMaxPerHost)
+
+    # Keep the index of the location together with its result. A failed location must not stop the others.
+    async def check(pIndex, pLat, pLong):
+        try:
+            return pIndex, await checkLivableAsync(pLat, pLong, pUseTemperatureGrid, pipeline)
+        except Exception as e:
+            return pIndex, {'livable': None, 'error': str(e)}
+
+    try:
+        tasks = [asyncio.ensure_future(check(index, city['latitude'], city['longitude'])) for index, city in pLocations.iterrows()]
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        pipeline['executor'].shutdown(wait=False)
+
+
+
+# Runs a coroutine from synchronous code and waits for its result. Inside a running event loop (e.g. Jupyter), 'asyncio.run'
+# isn't allowed, so the coroutine gets its own loop in a separate thread. Async callers should await the async functions directly.
+def runSync(pCoroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(pCoroutine)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, pCoroutine).result()
+
+
+
+# Checks, whether a location (given by coordinates), will still be livable in 2050.
+# If 'pUseTemperatureGrid' is set, the temperature change is read from the precomputed NetCDF grid instead of Open-Meteo.
+# Blocks until the check is done, in async code use 'checkLivableAsync' instead.
+def checkLivable(pLat, pLong, pUseTemperatureGrid=False, pEnsemble=None):
+    # Run the concurrent check and wait for it.
+    result = runSync(checkLivableAsync(pLat, pLong, pUseTemperatureGrid, pEnsemble=pEnsemble))
+
+    print(f"Percentage Increse of rain: {result['percentageIncreaseRain']}% / {config.allowedDeviationPercentageOfRain}%")
+    print(f"Percentage Increse of temp: {result['percentageIncreaseTemp']}% / {config.allowedDeviationPercentageOfTemp}%")
+    print(f"Percentage Increse of wind: {result['percentageIncreaseWind']}% / {config.allowedDeviationPercentageOfWind}%")
+    print(f"Still above sea level: {result['aboveSea']}")
+    print(f"Still livable: {result['livable']}")
+    printEnsemble(result)
+
+    # Return, whether the location the livable or not.
+    return result['livable']
+
+
+
+# Prints the ensemble results of a location, if it was checked with the ensemble.
+def printEnsemble(pResult):
+    if 'ensembleModels' not in pResult:
+        return
+
+    print(f"Ensemble of {pResult['ensembleModels']} models:")
+    for name, variable in [('Rain', 'rain'), ('Temp', 'temp'), ('Wind', 'wind')]:
+        print(f"  Percentage Increse of {variable}: {pResult[f'ensembleMean{name}']}% ± {pResult[f'ensembleSpread{name}']}%, models agree: {pResult[f'ensembleAgreement{name}']}")
+    print(f"  Still livable: {pResult['ensembleLivable']} ({pResult['ensembleLivableShare']:.0%} of the models)")
+
+
+
+# Checks for all given locations (e.g. from 'getCities'), whether they will still be livable in 2050.
+# Returns the percentage changes, the elevation and the result per location as DataFrame columns.
+# If a metrics file is given, the climate changes get read from (and stored to) it instead of being queried again.
+# With 'pEnsemble' (default: 'climateEnsemble' of the config), the ensemble results of all models get added (one more request per batch).
+def checkLivableBatch(pLocations, pMetricsFile=None, pEnsemble=None):
+    if pEnsemble is None:
+        pEnsemble = config.climateEnsemble
+
+    if pMetricsFile is None:
+        result = getClimateMetrics(pLocations)
+    else:
+        result = storeClimateMetrics(pLocations, pMetricsFile)
+
+    # Calculate, whether the locations will be flooded or not.
+    result['aboveSea'] = evaluateSeaLevelScenarios(result['elevation'].to_numpy(float), [config.seaLevelRise])[0]
+
+    # A location is livable, if no change exceeds its upper or lower bound and it won't be flooded.
+    result['livable'] = (
+        (result['percentageIncreaseRain'].abs() <= config.allowedDeviationPercentageOfRain)
+        & (result['percentageIncreaseTemp'].abs() <= config.allowedDeviationPercentageOfTemp)
+        & (result['percentageIncreaseWind'].abs() <= config.allowedDeviationPercentageOfWind)
+        & result['aboveSea']
+    )
+
+    if pEnsemble:
+        # The legacy medians come from the result cache, the models of the ensemble from one request per batch of locations.
+        legacy = getLegacyClimateDataBatch(pLocations).to_numpy(float)
+        ensemble = evaluateEnsemble(legacy, getEnsembleClimateDataBatch(pLocations), result['aboveSea'].to_numpy(bool))
+        result = result.join(ensemble.set_axis(pLocations.index))
+
+    return result
+
+
+
+# Percentage changes of the climate variables and the elevation for a bunch of locations (see 'checkLivableBatch').
+def getClimateMetrics(pLocations):
+    # Query the legacy and future weather conditions of all locations with as few requests as possible.
+    legacy = getLegacyClimateDataBatch(pLocations)
+    future = getFutureClimateDataBatch(pLocations)
+
+    result = pd.DataFrame(index=pLocations.index)
+
+    # Calculate the percentage differences between the past and the future for all locations at once.
+    for variable, column in [('precipitation_sum', 'percentageIncreaseRain'), ('temperature_2m_max', 'percentageIncreaseTemp'), ('wind_speed_10m_max', 'percentageIncreaseWind')]:
+        result[column] = ((future[f"future_{variable}"] - legacy[f"legacy_{variable}"]) / legacy[f"legacy_{variable}"] * 100).round(3)
+
+    result['elevation'] = isStillAboveSeaLevel(pLocations['latitude'].to_numpy(float), pLocations['longitude'].to_numpy(float))[1]
+
+    return result
+
+
+
+# Builds the version of the climate metrics from everything they depend on: the apis, the compared years, the model, the statistic and the elevation backend.
+# Metrics of another version (e.g. from before 'baselineYears' changed) don't get used.
+# The sea level rise isn't part of it, because the raw elevation gets stored and only compared with the rise when the metrics are evaluated.
+def getClimateMetricsVersion():
+    return getResultCacheVersion('topTenMedian', config.archiveApi, config.climateApi, config.baselineYears, config.targetYears, config.climateModel, getElevationBackendVersion())
+
+
+
+# Reads the stored climate metrics of the current version (see 'getClimateMetricsVersion'). Locations are identified by their rounded coordinates.
+def readClimateMetrics(pFile=None):
+    if pFile is None:
+        pFile = config.climateMetricsFile
+
+    columns = ['name', 'latitude', 'longitude', 'percentageIncreaseRain', 'percentageIncreaseTemp', 'percentageIncreaseWind', 'elevation', 'version']
+    if not os.path.exists(pFile):
+        return pd.DataFrame(columns=columns)
+
+    metrics = pd.read_csv(pFile, dtype={'version': str})
+    # Files from before the version column can't be matched to any settings.
+    if 'version' not in metrics:
+        return pd.DataFrame(columns=columns)
+
+    return metrics[metrics['version'] == getClimateMetricsVersion()].reset_index(drop=True)
+
+
+
+# Returns the climate metrics of the given locations. Only locations, which aren't in the metrics file yet, get queried (and appended).
+# The rows are stored with their version, so changed settings query the locations again.
+# Rows with a failed lookup (a NaN metric or elevation) don't get stored, so they get queried again the next time.
+def storeClimateMetrics(pLocations, pFile=None):
+    if pFile is None:
+        pFile = config.climateMetricsFile
+
+    columns = ['percentageIncreaseRain', 'percentageIncreaseTemp', 'percentageIncreaseWind', 'elevation']
+    stored = readClimateMetrics(pFile)
+    storedKeys = pd.MultiIndex.from_arrays([stored['latitude'].astype(float).round(config.resultCacheDigits), stored['longitude'].astype(float).round(config.resultCacheDigits)])
+    stored = stored.set_axis(storedKeys)[columns].astype(float)
+    # Failed rows, which were stored before they got skipped, count as missing.
+    stored = stored.dropna()
+    stored = stored[~stored.index.duplicated(keep='last')]
+
+    keys = pd.MultiIndex.from_arrays([pLocations['latitude'].astype(float).round(config.resultCacheDigits), pLocations['longitude'].astype(float).round(config.resultCacheDigits)])
+    missing = ~keys.isin(stored.index)
+
+    if missing.any():
+        queried = getClimateMetrics(pLocations[missing])
+        rows = pd.DataFrame({
+            'name': pLocations.loc[missing, 'name'] if 'name' in pLocations else None,
+            'latitude': pLocations.loc[missing, 'latitude'],
+            'longitude': pLocations.loc[missing, 'longitude']
+        }).join(queried)
+        rows['version'] = getClimateMetricsVersion()
+        rows = rows[queried[columns].notna().all(axis=1)]
+        # A file without the version column gets replaced, its rows can't be used anyway.
+        if len(rows) > 0:
+            appendToCSV(pFile, rows, not os.path.exists(pFile) or 'version' not in pd.read_csv(pFile, nrows=0).columns)
+        stored = pd.concat([stored, queried.set_axis(keys[missing])])
+        stored = stored[~stored.index.duplicated(keep='last')]
+
+    return stored.reindex(keys).set_axis(pLocations.index)
+
+
+
+# Evaluates every combination of the given thresholds over all locations at once and counts the livable ones.
+# Every location only gets sorted into the bin of the smallest thresholds it satisfies, the counts then follow from cumulative sums.
+# Returns a Series indexed by all threshold combinations (use 'unstack' for a table).
+def sensitivityAnalysis(pMetrics, pRainThresholds=None, pTempThresholds=None, pWindThresholds=None, pSeaLevelRises=None):
+    axes = {
+        'allowedDeviationRain': (np.abs(pMetrics['percentageIncreaseRain'].to_numpy(float)), pRainThresholds, config.allowedDeviationPercentageOfRain),
+        'allowedDeviationTemp': (np.abs(pMetrics['percentageIncreaseTemp'].to_numpy(float)), pTempThresholds, config.allowedDeviationPercentageOfTemp),
+        'allowedDeviationWind': (np.abs(pMetrics['percentageIncreaseWind'].to_numpy(float)), pWindThresholds, config.allowedDeviationPercentageOfWind)
+    }
+
+    thresholds = []
+    bins = []
+    for values, limits, default in axes.values():
+        limits = np.sort(np.atleast_1d(np.asarray(default if limits is None else limits, dtype=float)))
+        # First threshold the value doesn't exceed. Values above every threshold (or NaN) end up in the overflow bin.
+        index = np.searchsorted(limits, values, side='left')
+        index[np.isnan(values)] = len(limits)
+        thresholds.append(limits)
+        bins.append(index)
+
+    # A location stays above the sea for every rise lower than its elevation - 1m. Missing elevations count as flooded.
+    rises = np.sort(np.atleast_1d(np.asarray(config.seaLevelRise if pSeaLevelRises is None else pSeaLevelRises, dtype=float)))
+    elevations = pMetrics['elevation'].to_numpy(float)
+    surviving = np.searchsorted(rises, elevations - 1.0, side='left')
+    surviving[np.isnan(elevations)] = 0
+    thresholds.append(rises)
+    bins.append(surviving)
+
+    shape = tuple(len(limits) + 1 for limits in thresholds)
+    counts = np.bincount(np.ravel_multi_index(bins, shape), minlength=np.prod(shape)).reshape(shape)
+
+    # Every location is livable for all thresholds at or above its bin ...
+    for axis in range(3):
+        counts = np.cumsum(counts, axis=axis)
+    # ... and for all sea level rises below the number of rises it survives.
+    counts = np.flip(np.cumsum(np.flip(counts, axis=3), axis=3), axis=3)
+    counts = counts[:-1, :-1, :-1, 1:]
+
+    return pd.Series(counts.ravel(), index=pd.MultiIndex.from_product(thresholds, names=list(axes) + ['seaLevelRise']), name='livable')
+
+
+
+# Prints how the number of livable locations changes compared to the current thresholds.
+def printSensitivity(pMetrics, pRainThresholds=None, pTempThresholds=None, pWindThresholds=None, pSeaLevelRises=None):
+    counts = sensitivityAnalysis(pMetrics, pRainThresholds, pTempThresholds, pWindThresholds, pSeaLevelRises)
+    current = sensitivityAnalysis(pMetrics).iloc[0]
+
+    print(f"Livable with the current thresholds: {current}/{len(pMetrics)}")
+    print(f"Fewest livable: {counts.min()} at {dict(zip(counts.index.names, map(float, counts.idxmin())))}")
+    print(f"Most livable: {counts.max()} at {dict(zip(counts.index.names, map(float, counts.idxmax())))}")
+
+    return counts - current
+
+
+
+# Iterated over a bunch of locations an performs the 'livable check'
+def checkCityForLivable(pLocations):
+    startRunStats('cities')
+
+    # Check all locations in a few batched requests and keep their climate changes for later threshold tests.
+    results = checkLivableBatch(pLocations, config.climateMetricsFile)
+
+    for index, city in pLocations.iterrows():
+        result = results.loc[index]
+        print(f">> City: {city['name']}")
+        print(f"Percentage Increse of rain: {result['percentageIncreaseRain']}% / {config.allowedDeviationPercentageOfRain}%")
+        print(f"Percentage Increse of temp: {result['percentageIncreaseTemp']}% / {config.allowedDeviationPercentageOfTemp}%")
+        print(f"Percentage Increse of wind: {result['percentageIncreaseWind']}% / {config.allowedDeviationPercentageOfWind}%")
+        print(f"Still above sea level: {result['aboveSea']}")
+        print(f"Still livable: {result['livable']}")
+        printEnsemble(result)
+        print("")
+
+    writeRunSummary(cities=len(pLocations), livable=int(results['livable'].sum()))
+    return results
+
+
+
+# Checks a large number of locations concurrently and prints every city as soon as it is done.
+def checkCityForLivableAsync(pLocations, pUseTemperatureGrid=False, pMaxPerHost=None):
+    startRunStats('citiesAsync')
+
+    async def run():
+        results = {}
+        progress = Progress(len(pLocations), 'Cities')
+        async for index, result in streamLivable(pLocations, pUseTemperatureGrid, pMaxPerHost):
+            print(f">> City: {pLocations.loc[index, 'name']} - still livable: {result['livable']}")
+            results[index] = result
+            progress.update()
+        return results
+
+    # Return the results in the order of the given locations.
+    results = pd.DataFrame.from_dict(runSync(run()), orient='index').reindex(pLocations.index)
+    writeRunSummary(cities=len(pLocations))
+    return results
@@ -0,0 +1,275 @@
+import json
+import os
+import re
+from everland import config
+from everland.elevation import isStillAboveSeaLevel
+from everland.livable import checkLivableBatch
+from everland.results import cellColors, cellPalette, classifyCells, loadSweepData, rasterizeClasses
+from everland.stats import startRunStats, timeStage, writeRunSummary
+from everland.tiles import buildTilePyramid
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+folium = LazyModule('folium')
+
+
+
+def plotLivable(pLocations):
+    # Create an empty map
+    m = folium.Map(location=[0, 0], zoom_start=2)
+    # Add a tile layer
+    folium.TileLayer('cartodbpositron').add_to(m)
+
+    numberOfItems = len(pLocations)
+
+    # Check all cities in a few batched requests.
+    livable = checkLivableBatch(pLocations)['livable']
+
+    # Add a circle marker for each city
+    for position, (index, city) in enumerate(pLocations.iterrows()):
+        name = city['name']
+        lat = city['latitude']
+        lon = city['longitude']
+
+        # Check if the city is considered livable
+        if(livable.loc[index]):
+            print(f"Area '{name}' is still good. [{position+1}/{numberOfItems}]")
+            # Add a green circle marker for livable cities
+            folium.CircleMarker(
+                location=[lat, lon],
+                radius=city['population'] * 0.000001,
+                color='green',
+                fill=True,
+                fill_color='green'
+            ).add_to(m)
+        else:
+            print(f"Area '{name}' won't be good [{position+1}/{numberOfItems}]")
+            # Add a red circle marker for non-livable cities
+            folium.CircleMarker(
+                location=[lat, lon],
+                radius=city['population'] * 0.000001,
+                color='red',
+                fill=True,
+                fill_color='red'
+            ).add_to(m)
+
+    # Save the map as an HTML file and display it in the browser
+    m.save('./html/world_cities_map.html')
+    m.show_in_browser()
+
+
+
+def plotOnlySeaLevel(pLocations):
+    # Create an empty map
+    m = folium.Map(location=[0, 0], zoom_start=2)
+    # Add a tile layer
+    folium.TileLayer('cartodbpositron').add_to(m)
+
+    numberOfItems = len(pLocations)
+
+    # Check all cities in one batched lookup.
+    aboveSea, _ = isStillAboveSeaLevel(pLocations['latitude'].to_numpy(float), pLocations['longitude'].to_numpy(float))
+
+    # Add a circle marker for each city
+    for position, (index, city) in enumerate(pLocations.iterrows()):
+        name = city['name']
+        lat = city['latitude']
+        lon = city['longitude']
+        # Check if the city is at sea level
+        if(aboveSea[position]):
+            print(f"Area '{name}' is still good. [{position+1}/{numberOfItems}]")
+            # Add a green circle marker for cities at sea level
+            folium.CircleMarker(
+                location=[lat, lon],
+                radius=city['population'] * 0.000001,
+                color='green',
+                fill=True,
+                fill_color='green'
+            ).add_to(m)
+        else:
+            print(f"Area '{name}' won't be good [{position+1}/{numberOfItems}]")
+            # Add a red circle marker for cities not at sea level
+            folium.CircleMarker(
+                location=[lat, lon],
+                radius=city['population'] * 0.000001,
+                color='red',
+                fill=True,
+                fill_color='red'
+            ).add_to(m)
+
+    # Save the map as an HTML file and display it in the browser
+    m.save('./html/world_cities_map.html')
+    m.show_in_browser()
+
+
+
+# Builds a single GeoJSON FeatureCollection of the classified cells. Neighbouring cells of the same class in a row get merged.
+def buildCellFeatureCollection(pData, pSizes, pClasses):
+    features = []
+    data = pd.DataFrame({'lat': pData['latitude'].to_numpy(float), 'lon': pData['longitude'].to_numpy(float), 'size': pSizes, 'class': pClasses})
+    data = data[data['class'] > 0].sort_values(['lat', 'size', 'lon'])
+
+    run = None
+    for lat, lon, size, cellClass in data.itertuples(index=False):
+        # Extend the current run, if this cell directly follows it.
+        if run is not None and run[0] == lat and run[2] == size and run[3] == cellClass and abs(run[4] - (lon - size / 2)) < 1e-9:
+            run[4] = lon + size / 2
+            continue
+
+        if run is not None:
+            features.append(run)
+        run = [lat, lon - size / 2, size, cellClass, lon + size / 2]
+
+    if run is not None:
+        features.append(run)
+
+    return {
+        'type': 'FeatureCollection',
+        'features': [{
+            'type': 'Feature',
+            'properties': {'color': cellColors[int(cellClass)]},
+            'geometry': {'type': 'Polygon', 'coordinates': [[[west, lat - size / 2], [east, lat - size / 2], [east, lat + size / 2], [west, lat + size / 2], [west, lat - size / 2]]]}
+        } for lat, west, size, cellClass, east in features]
+    }
+
+
+
+# Rasterizes the classified cells to a RGBA image with one pixel per smallest cell. Returns the image and its bounds.
+def buildCellImage(pData, pSizes, pClasses):
+    grid, bounds = rasterizeClasses(pData, pSizes, pClasses)
+    return np.asarray(cellPalette, dtype=np.uint8)[grid], bounds
+
+
+
+# Function to plot data from a file on a map
+# 'pMode' chooses the rendering: 'image' (one PNG overlay), 'geojson' (one GeoJSON layer), 'rectangles' (one rectangle per cell)
+# or 'tiles' (a pyramid of PNG tiles next to the html file, which stays sharp at every zoom level).
+def plotDataFromFile(pFile, pMode='image', pMaxZoom=None, pWorkers=None):
+    startRunStats('plot')
+
+    # Create a map
+    m = folium.Map(location=[0, 0], zoom_start=2)
+    folium.TileLayer('cartodbpositron').add_to(m)
+
+    # Load data from the file (columnar or geojson)
+    with timeStage('load'):
+        df = loadSweepData(pFile)
+
+    # Extract step size from the file name
+    steps = int(re.search(r'\d+', pFile).group())
+
+    with timeStage('render'):
+        if pMode != 'rectangles':
+            # Cells of an adaptive sweep have their own size.
+            sizes = df['size'].fillna(steps).to_numpy(float) if 'size' in df else np.full(len(df), float(steps))
+            classes = classifyCells(df)
+
+            if pMode == 'geojson':
+                # All cells as one layer, colored by their 'color' property.
+                folium.GeoJson(
+                    buildCellFeatureCollection(df, sizes, classes),
+                    style_function=lambda feature: {'fillColor': feature['properties']['color'], 'color': None, 'weight': 0, 'fillOpacity': 0.5}
+                ).add_to(m)
+            elif pMode == 'tiles':
+                maxZoom = pMaxZoom if pMaxZoom is not None else config.tileMaxZoom
+                folder = os.path.join(config.tileFolder, f"Scale{steps}")
+                buildTilePyramid(df, sizes, classes, folder, maxZoom, pWorkers)
+                # Leaflet scales the tiles of the highest level up, when zooming in further.
+                folium.TileLayer(
+                    tiles=os.path.relpath(folder, './html').replace(os.sep, '/') + '/{z}/{x}/{y}.png',
+                    attr='Everland',
+                    name=f"Scale {steps}",
+                    overlay=True,
+                    max_native_zoom=maxZoom,
+                    max_zoom=18
+                ).add_to(m)
+            else:
+                image, (south, north, west, east) = buildCellImage(df, sizes, classes)
+                # Web maps can't show the poles, so cut the image at the limits of the mercator projection.
+                rowLats = north - (np.arange(image.shape[0]) + 0.5) * (north - south) / image.shape[0]
+                visible = np.abs(rowLats) < 85
+                folium.raster_layers.ImageOverlay(
+                    image=image[visible],
+                    bounds=[[rowLats[visible].min() - (north - south) / image.shape[0] / 2, west], [rowLats[visible].max() + (north - south) / image.shape[0] / 2, east]],
+                    mercator_project=True
+                ).add_to(m)
+        else:
+            # Iterate through data points
+            data = df.to_dict('records')
+            for i in range(len(data)):
+                lat = data[i]['latitude']
+                lon = data[i]['longitude']
+                # Cells of an adaptive sweep have their own size.
+                delta_lat = data[i].get('size', steps) / 2
+                delta_lon = data[i].get('size', steps) / 2
+                bounds = [
+                    (lat - delta_lat, lon - delta_lon),
+                    (lat + delta_lat, lon + delta_lon)
+                ]
+
+                # Skip cells, whose elevation lookup failed.
+                if(not pd.isna(data[i]['elevation']) and data[i]['elevation'] > 0.0):
+                    if not(data[i]['aboveSea']):
+                        folium.Rectangle(
+                            bounds=bounds,
+                            color=None,
+                            fill=True,
+                            fill_color='blue',
+                            fill_opacity=0.5
+                        ).add_to(m)
+                    elif not (data[i]['tempChangeOK']):
+                        folium.Rectangle(
+                            bounds=bounds,
+                            color=None,
+                            fill=True,
+                            fill_color='red',
+                            fill_opacity=0.5
+                        ).add_to(m)
+                    else:
+                        folium.Rectangle(
+                            bounds=bounds,
+                            color=None,
+                            fill=True,
+                            fill_color='green',
+                            fill_opacity=0.5
+                        ).add_to(m)
+
+    # Save the map as an HTML file
+    with timeStage('save'):
+        m.save(f'./html/worldFloodMapScale{steps}.html')
+    writeRunSummary(file=pFile, mode=pMode, cells=len(df))
+    # Show the map in the default browser
+    m.show_in_browser()
+
+
+
+# Function to plot data from a file on a map
+def plotRawDataFromFile(pFile):
+    startRunStats('plotRaw')
+
+    # Create a map
+    m = folium.Map(location=[0, 0], zoom_start=2)
+    folium.TileLayer('cartodbpositron').add_to(m)
+
+    # Load data from the file
+    with timeStage('load'):
+        with open(pFile, 'r') as f:
+            data = json.load(f)
+
+    # Extract step size from the file name
+    steps = int(re.search(r'\d+', pFile).group())
+
+    # Add all points as a single GeoJSON layer, instead of one circle object per point.
+    with timeStage('render'):
+        folium.GeoJson(
+            {'type': 'Feature', 'properties': {}, 'geometry': {'type': 'MultiPoint', 'coordinates': [[point['longitude'], point['latitude']] for point in data]}},
+            marker=folium.Circle(radius=0.001, color='black')
+        ).add_to(m)
+
+    # Save the map as an HTML file
+    with timeStage('save'):
+        m.save(f'./html/dummy_worldFloodMapScale{steps}.html')
+    writeRunSummary(file=pFile, points=len(data))
+    # Show the map in the default browser
+    m.show_in_browser()
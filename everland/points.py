@@ -0,0 +1,112 @@
+import json
+import re
+from everland.elevation import isStillAboveSeaLevel
+from everland.livable import checkLivableBatch
+from everland.results import appendToCSV
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+
+
+# Reads the point features of a GeoJSON file incrementally, without loading the whole document.
+# Yields chunks of up to 'pChunkSize' features as dicts of NumPy arrays (name, population, latitude, longitude).
+# A feature, which can't be decoded from 'pMaxFeatureSize' characters, is malformed and raises a ValueError with its offset.
+# Features without a geometry (null is valid GeoJSON) have no location and get skipped.
+def iterGeoJsonFeatures(pFile, pChunkSize=10000, pNameProperty='gis_name', pBlockSize=1 << 20, pMaxFeatureSize=16 << 20):
+    decoder = json.JSONDecoder()
+    separators = re.compile(r'[\s,]*')
+
+    with open(pFile, 'r', encoding='utf-8') as f:
+        # Skip everything up to the start of the features array. 'consumed' counts the characters before the buffer.
+        buffer = ''
+        consumed = 0
+        while True:
+            block = f.read(pBlockSize)
+            if not block:
+                return
+            buffer += block
+            match = re.search(r'"features"\s*:\s*\[', buffer)
+            if match:
+                position = match.end()
+                break
+            # Keep the end of the buffer, the key might be split between two blocks.
+            consumed += max(len(buffer) - 64, 0)
+            buffer = buffer[-64:]
+
+        names, populations, lats, longs = [], [], [], []
+
+        while True:
+            # Skip the whitespace and commas between two features.
+            position = separators.match(buffer, position).end()
+
+            if position < len(buffer) and buffer[position] == ']':
+                break
+
+            try:
+                # Decode the next feature directly from the buffer.
+                feature, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                # A feature can't be longer than the limit, so the rest of the file doesn't need to be read.
+                if len(buffer) - position > pMaxFeatureSize:
+                    raise ValueError(f"Malformed GeoJSON feature at character {consumed + position} of '{pFile}': {e.msg}") from e
+
+                # The feature isn't complete yet, so read the next block (and drop everything already decoded).
+                block = f.read(pBlockSize)
+                if not block:
+                    if position >= len(buffer):
+                        break
+                    raise ValueError(f"Malformed GeoJSON feature at character {consumed + position} of '{pFile}': {e.msg}") from e
+                consumed += position
+                buffer = buffer[position:] + block
+                position = 0
+                continue
+
+            geometry = feature.get('geometry')
+            if not geometry or not geometry.get('coordinates'):
+                continue
+
+            properties = feature.get('properties') or {}
+            coordinates = geometry['coordinates']
+            names.append(properties.get(pNameProperty))
+            populations.append(properties.get('population') or 0)
+            longs.append(coordinates[0])
+            lats.append(coordinates[1])
+
+            if len(names) == pChunkSize:
+                yield {'name': np.array(names, dtype=object), 'population': np.array(populations, dtype=float), 'latitude': np.array(lats, dtype=float), 'longitude': np.array(longs, dtype=float)}
+                names, populations, lats, longs = [], [], [], []
+
+        if len(names) > 0:
+            yield {'name': np.array(names, dtype=object), 'population': np.array(populations, dtype=float), 'latitude': np.array(lats, dtype=float), 'longitude': np.array(longs, dtype=float)}
+
+
+
+# Load GeoJSON file and extract relevant information
+def useGeoJson(pFile, pNameProperty='gis_name'):
+    # Read the features chunk by chunk and put the chunks together
+    chunks = [pd.DataFrame(chunk) for chunk in iterGeoJsonFeatures(pFile, pNameProperty=pNameProperty)]
+
+    # Return the DataFrame with the specified column names
+    if len(chunks) == 0:
+        return pd.DataFrame(columns=['name', 'population', 'latitude', 'longitude'])
+    return pd.concat(chunks, ignore_index=True)
+
+
+
+# Checks all points of a (large) GeoJSON file for the sea level, chunk by chunk, and writes the results to a CSV file.
+def checkSeaLevelGeoJson(pFile, pOutFile, pChunkSize=10000, pNameProperty='gis_name'):
+    for index, chunk in enumerate(iterGeoJsonFeatures(pFile, pChunkSize, pNameProperty)):
+        chunk['aboveSea'], chunk['elevation'] = isStillAboveSeaLevel(chunk['latitude'], chunk['longitude'])
+        appendToCSV(pOutFile, pd.DataFrame(chunk), index == 0)
+        print(f"Status: {index * pChunkSize + len(chunk['name'])} points checked")
+
+
+
+# Checks all points of a (large) GeoJSON file for livability, chunk by chunk, and writes the results to a CSV file.
+def checkLivableGeoJson(pFile, pOutFile, pChunkSize=1000, pNameProperty='gis_name'):
+    for index, chunk in enumerate(iterGeoJsonFeatures(pFile, pChunkSize, pNameProperty)):
+        locations = pd.DataFrame(chunk)
+        appendToCSV(pOutFile, pd.concat([locations, checkLivableBatch(locations)], axis=1), index == 0)
+        print(f"Status: {index * pChunkSize + len(locations)} points checked")
@@ -0,0 +1,291 @@
+import json
+import os
+from everland import config
+from everland.stats import timeStage
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+
+
+# Appends a DataFrame to a CSV file (with a header, if the file is still empty).
+def appendToCSV(pFile, pData, pFirst):
+    with timeStage('csv'):
+        pData.to_csv(pFile, mode='w' if pFirst else 'a', header=pFirst, index=False)
+
+
+
+# Columns of a sweep result, which get stored as numbers ('aboveSea' and 'tempChangeOK' as -1 = unknown, 0 = no, 1 = yes).
+sweepColumns = {'aboveSea': 'int8', 'elevation': 'float32', 'tempChangeOK': 'int8', 'percentageTempChange': 'float32', 'size': 'float32'}
+
+
+
+# Puts the columns of a sweep result (one value per cell) into 2D (latitude x longitude) arrays.
+# Returns None, if the coordinates don't form a complete grid.
+def toSweepGrid(pColumns):
+    lats = pColumns['latitude']
+    longs = pColumns['longitude']
+    axisLats = np.unique(lats)
+    axisLongs = np.unique(longs)
+
+    if len(lats) != len(axisLats) * len(axisLongs):
+        return None
+
+    # Put every value at its place in the grid.
+    rows = np.searchsorted(axisLats, lats)
+    cols = np.searchsorted(axisLongs, longs)
+    occupied = np.zeros((len(axisLats), len(axisLongs)), dtype=bool)
+    occupied[rows, cols] = True
+    if not occupied.all():
+        return None
+
+    grid = {'latitude': axisLats, 'longitude': axisLongs}
+    for column, values in pColumns.items():
+        if column not in ('latitude', 'longitude'):
+            grid[column] = np.empty((len(axisLats), len(axisLongs)), dtype=values.dtype)
+            grid[column][rows, cols] = values
+
+    return grid
+
+
+
+# Writes sweep results (records or a DataFrame) to a columnar file: '.npz' (NumPy) or '.parquet' (needs pyarrow).
+# If the coordinates form a complete grid, the '.npz' file stores one 2D (latitude x longitude) array per column.
+def writeSweepResults(pRecords, pFile):
+    df = pd.DataFrame(pRecords)
+
+    if pFile.endswith('.parquet'):
+        df.to_parquet(pFile, index=False)
+        return
+
+    columns = {'latitude': df['latitude'].to_numpy(float), 'longitude': df['longitude'].to_numpy(float)}
+
+    # Convert every column to a compact numeric type. Missing values become NaN or -1.
+    for column, dtype in sweepColumns.items():
+        if column not in df:
+            continue
+        if dtype == 'int8':
+            columns[column] = df[column].map({True: 1, False: 0}).fillna(-1).to_numpy(np.int8)
+        else:
+            columns[column] = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype)
+
+    grid = toSweepGrid(columns)
+    if grid is not None:
+        np.savez(pFile, layout='grid', **grid)
+    else:
+        # Irregular coordinates (e.g. adaptive sweeps) get stored as plain columns.
+        np.savez(pFile, layout='points', **columns)
+
+
+
+# Reads a sweep result file ('.npz', '.parquet', '.geojson' or the records format) into a dict of NumPy arrays, one value per cell.
+def readSweepResults(pFile):
+    if pFile.endswith('.npz'):
+        with np.load(pFile) as data:
+            columns = {name: data[name] for name in data.files if name != 'layout'}
+            layout = str(data['layout'])
+
+        if layout == 'grid':
+            # Expand the axes to the coordinates of every cell. The columns are only reshaped, not copied.
+            lats, longs = np.meshgrid(columns['latitude'], columns['longitude'], indexing='ij')
+            columns = {name: values.ravel() for name, values in columns.items() if name not in ('latitude', 'longitude')}
+            columns['latitude'] = lats.ravel()
+            columns['longitude'] = longs.ravel()
+
+        return columns
+
+    if pFile.endswith('.parquet'):
+        df = pd.read_parquet(pFile)
+    else:
+        with open(pFile, 'r') as f:
+            data = json.load(f)
+        # Real GeoJSON (from 'exportSweepToGeoJson') or the plain records of the older files.
+        if isinstance(data, dict) and 'features' in data:
+            df = pd.json_normalize([feature['properties'] for feature in data['features']])
+        else:
+            df = pd.DataFrame(data)
+
+    columns = {'latitude': df['latitude'].to_numpy(float), 'longitude': df['longitude'].to_numpy(float)}
+    for column, dtype in sweepColumns.items():
+        if column in df:
+            columns[column] = df[column].map({True: 1, False: 0}).fillna(-1).to_numpy(np.int8) if dtype == 'int8' else pd.to_numeric(df[column], errors='coerce').to_numpy(dtype)
+
+    return columns
+
+
+
+# Reads a sweep result file as a grid: the latitude and longitude axes and one 2D array per column.
+def readSweepGrid(pFile):
+    if pFile.endswith('.npz'):
+        with np.load(pFile) as data:
+            if str(data['layout']) == 'grid':
+                return {name: data[name] for name in data.files if name != 'layout'}
+
+    grid = toSweepGrid(readSweepResults(pFile))
+    if grid is None:
+        raise ValueError(f"'{pFile}' doesn't contain a complete grid.")
+
+    return grid
+
+
+
+# Reads a sweep result file into a DataFrame with the columns of the records format.
+def loadSweepData(pFile):
+    columns = readSweepResults(pFile)
+    df = pd.DataFrame({'latitude': columns['latitude'], 'longitude': columns['longitude']})
+
+    for column, dtype in sweepColumns.items():
+        if column in columns:
+            # Unknown flags (-1) become missing values.
+            df[column] = pd.array(columns[column] == 1, dtype='boolean') if dtype == 'int8' else columns[column]
+            if dtype == 'int8':
+                df.loc[columns[column] == -1, column] = pd.NA
+
+    return df
+
+
+
+# Converts a sweep result file to a valid GeoJSON FeatureCollection with one point per cell.
+def exportSweepToGeoJson(pFile, pOutFile=None):
+    if pOutFile is None:
+        pOutFile = os.path.splitext(pFile)[0] + '.geojson'
+
+    df = loadSweepData(pFile)
+    # Missing values become null.
+    records = df.astype(object).where(df.notna(), None).to_dict('records')
+
+    with open(pOutFile, 'w') as f:
+        json.dump({
+            'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [record['longitude'], record['latitude']]}, 'properties': record} for record in records]
+        }, f)
+
+    return pOutFile
+
+
+
+# Compares two sweep results and counts the cells, whose classification changed (e.g. between two scales or runs).
+def diffSweepResults(pFileA, pFileB):
+    a = loadSweepData(pFileA)
+    b = loadSweepData(pFileB)
+    a['class'] = classifyCells(a)
+    b['class'] = classifyCells(b)
+
+    # Only compare the cells, which are part of both results.
+    merged = a.merge(b, on=['latitude', 'longitude'], suffixes=('A', 'B'))
+    changed = merged['classA'] != merged['classB']
+
+    return {
+        'cells': len(merged),
+        'changed': int(changed.sum()),
+        # Number of cells per pair of classes (before, after), for all changed cells.
+        'transitions': merged[changed].groupby(['classA', 'classB']).size().to_dict()
+    }
+
+
+
+# Checks the given elevations against many sea level rise scenarios at once (same rule as 'isStillAboveSeaLevel').
+# Returns one 'aboveSea' layer per scenario, with the scenarios as the first axis.
+def evaluateSeaLevelScenarios(pElevations, pSeaLevelRises):
+    elevations = np.asarray(pElevations, dtype=float)
+    rises = np.asarray(pSeaLevelRises, dtype=float).reshape((-1,) + (1,) * elevations.ndim)
+
+    return (elevations[None] - rises) > 1.0
+
+
+
+# Classifies a sweep grid for every combination of sea level rise and allowed temperature deviation in a single pass.
+# The result has the axes (sea level rise x temperature deviation x latitude x longitude) with the classes of 'classifyCells'.
+def classifyScenarios(pSweepFile, pSeaLevelRises, pAllowedTempDeviations=None, pOutFile=None):
+    if pAllowedTempDeviations is None:
+        pAllowedTempDeviations = [config.allowedDeviationPercentageOfTemp]
+
+    grid = readSweepGrid(pSweepFile)
+    elevations = grid['elevation'].astype(float)
+    temps = np.abs(grid['percentageTempChange'].astype(float))
+    deviations = np.asarray(pAllowedTempDeviations, dtype=float)
+
+    # Only land cells get classified (failed lookups have no elevation).
+    land = np.nan_to_num(elevations, nan=0.0) > 0.0
+    # (rise x 1 x lat x lon) and (1 x deviation x lat x lon), broadcast against each other.
+    aboveSea = evaluateSeaLevelScenarios(elevations, pSeaLevelRises)[:, None]
+    tempChangeOK = (temps[None] < deviations.reshape(-1, 1, 1))[None]
+
+    classes = np.where(aboveSea, np.where(tempChangeOK, 3, 2), 1).astype(np.int8)
+    classes = np.where(land, classes, 0).astype(np.int8)
+
+    if pOutFile is not None:
+        np.savez(pOutFile, latitude=grid['latitude'], longitude=grid['longitude'], seaLevelRise=np.asarray(pSeaLevelRises, dtype=float), allowedTempDeviation=deviations, classes=classes)
+
+    return classes
+
+
+
+# Counts the land cells per class for every scenario of 'classifyScenarios' as a DataFrame.
+def summarizeScenarios(pSweepFile, pSeaLevelRises, pAllowedTempDeviations=None):
+    if pAllowedTempDeviations is None:
+        pAllowedTempDeviations = [config.allowedDeviationPercentageOfTemp]
+
+    classes = classifyScenarios(pSweepFile, pSeaLevelRises, pAllowedTempDeviations)
+    # Number of cells per class (0-3) for every scenario at once.
+    flat = classes.reshape(classes.shape[0], classes.shape[1], -1)
+    counts = np.stack([(flat == cellClass).sum(axis=2) for cellClass in range(4)], axis=2)
+
+    rises, deviations = np.meshgrid(pSeaLevelRises, pAllowedTempDeviations, indexing='ij')
+    return pd.DataFrame({
+        'seaLevelRise': rises.ravel(),
+        'allowedTempDeviation': deviations.ravel(),
+        'flooded': counts[:, :, 1].ravel(),
+        'temperature': counts[:, :, 2].ravel(),
+        'good': counts[:, :, 3].ravel()
+    })
+
+
+
+# Colors of the classified cells: flooded, too hot (or too cold) and still good.
+cellColors = {1: 'blue', 2: 'red', 3: 'green'}
+# The same colors as RGBA, indexed by the class (class 0 stays transparent).
+cellPalette = [[0, 0, 0, 0], [0, 0, 255, 128], [255, 0, 0, 128], [0, 128, 0, 128]]
+
+
+
+# Classifies the cells of a sweep result: 0 = no land (or failed lookup), 1 = flooded, 2 = temperature change too big, 3 = good.
+def classifyCells(pData):
+    elevation = pd.to_numeric(pData['elevation'], errors='coerce').to_numpy(float)
+    aboveSea = pData['aboveSea'].fillna(False).to_numpy(bool)
+    tempChangeOK = pData['tempChangeOK'].fillna(False).to_numpy(bool)
+
+    classes = np.where(aboveSea, np.where(tempChangeOK, 3, 2), 1)
+    # Skip cells, whose elevation lookup failed or which are no land.
+    return np.where(np.nan_to_num(elevation, nan=0.0) > 0.0, classes, 0)
+
+
+
+# Rasterizes the classified cells to a grid of classes with one pixel per smallest cell (the first row is the northern edge).
+# Returns the grid and its bounds (south, north, west, east).
+def rasterizeClasses(pData, pSizes, pClasses):
+    lats = pData['latitude'].to_numpy(float)
+    longs = pData['longitude'].to_numpy(float)
+    resolution = pSizes.min()
+
+    # Bounds of the grid, the cells are centered on their coordinates.
+    south, north = (lats - pSizes / 2).min(), (lats + pSizes / 2).max()
+    west, east = (longs - pSizes / 2).min(), (longs + pSizes / 2).max()
+    grid = np.zeros((int(round((north - south) / resolution)), int(round((east - west) / resolution))), dtype=np.uint8)
+
+    # Cells bigger than the resolution (adaptive sweeps) cover a block of pixels, so paint every size separately.
+    for size in np.unique(pSizes):
+        cells = (pSizes == size) & (pClasses > 0)
+        pixels = int(round(size / resolution))
+        # Upper left pixel of every cell.
+        rows = np.rint((north - (lats[cells] + size / 2)) / resolution).astype(int)
+        cols = np.rint(((longs[cells] - size / 2) - west) / resolution).astype(int)
+        offsets = np.arange(pixels)
+
+        rowIndex = np.clip(rows[:, None, None] + offsets[None, :, None], 0, grid.shape[0] - 1)
+        colIndex = np.clip(cols[:, None, None] + offsets[None, None, :], 0, grid.shape[1] - 1)
+
+        grid[rowIndex, colIndex] = np.asarray(pClasses[cells], dtype=np.uint8)[:, None, None]
+
+    return grid, (south, north, west, east)
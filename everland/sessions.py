@@ -0,0 +1,93 @@
+import os
+import threading
+import urllib.parse
+from everland import config
+from everland.stats import countResponse
+
+
+
+# HTTP sessions, created on their first use per thread (a requests session isn't thread-safe)
+# and per process (pooled connections can't be shared with forked workers).
+sessionsLocal = threading.local()
+
+# Semaphores, which limit the requests in flight per host for all threads of the process. Get created by 'getHostSemaphore'.
+hostSemaphores = {}
+hostSemaphoresLock = threading.Lock()
+
+
+
+# Returns the session with the given name of this thread, creating it with 'pCreate' if needed.
+def getThreadSession(pName, pCreate):
+    if getattr(sessionsLocal, 'pid', None) != os.getpid():
+        sessionsLocal.pid = os.getpid()
+        sessionsLocal.sessions = {}
+
+    if pName not in sessionsLocal.sessions:
+        sessionsLocal.sessions[pName] = pCreate()
+
+    return sessionsLocal.sessions[pName]
+
+
+
+# Returns the semaphore of a host (e.g. 'archive-api.open-meteo.com'), which allows 'maxRequestsPerHost' requests at once.
+def getHostSemaphore(pHost):
+    with hostSemaphoresLock:
+        if pHost not in hostSemaphores:
+            hostSemaphores[pHost] = threading.BoundedSemaphore(config.maxRequestsPerHost)
+
+        return hostSemaphores[pHost]
+
+
+
+# Makes every request of a session adapter wait for a free slot of its host, no matter which thread or session sends it.
+def limitHosts(pAdapter):
+    send = pAdapter.send
+
+    def limitedSend(pRequest, **pKwargs):
+        with getHostSemaphore(urllib.parse.urlparse(pRequest.url).netloc):
+            return send(pRequest, **pKwargs)
+
+    pAdapter.send = limitedSend
+    return pAdapter
+
+
+
+# Returns the cached session of the Open-Meteo apis, which retries on errors.
+def getCacheSession():
+    def create():
+        import requests_cache
+        from retry_requests import retry
+
+        session = retry(requests_cache.CachedSession(config.httpCacheFile, expire_after=config.httpCacheExpiry), retries=5, backoff_factor=0.2)
+        for adapter in set(session.adapters.values()):
+            limitHosts(adapter)
+        session.hooks['response'].append(countResponse)
+        return session
+
+    return getThreadSession('cache', create)
+
+
+
+# Setup the Open-Meteo API client with cache and retry on error
+def getClimateClient():
+    def create():
+        import openmeteo_requests
+
+        return openmeteo_requests.Client(session=getCacheSession())
+
+    return getThreadSession('climate', create)
+
+
+
+# One pooled session for the elevation apis, so the connections get reused between requests.
+def getElevationSession():
+    def create():
+        import requests
+
+        session = requests.Session()
+        session.mount("http://", limitHosts(requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)))
+        session.mount("https://", limitHosts(requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)))
+        session.hooks['response'].append(countResponse)
+        return session
+
+    return getThreadSession('elevation', create)
@@ -0,0 +1,140 @@
+import json
+import time
+import threading
+import contextlib
+import math
+import urllib.parse
+from everland import config
+
+
+
+# Timings (seconds and calls per stage) and counters of the current run. Get reset by 'startRunStats'.
+runStats = {'name': None, 'started': time.time(), 'stages': {}, 'counters': {}}
+runStatsLock = threading.Lock()
+
+
+
+# Starts a new run: all timings and counters get reset.
+def startRunStats(pName):
+    global runStats
+
+    with runStatsLock:
+        runStats = {'name': pName, 'started': time.time(), 'stages': {}, 'counters': {}}
+
+
+
+# Increases a counter of the current run.
+def countEvent(pName, pAmount=1):
+    with runStatsLock:
+        runStats['counters'][pName] = runStats['counters'].get(pName, 0) + pAmount
+
+
+
+# Adds time to a stage of the current run.
+def addStageTime(pName, pSeconds, pCalls=1):
+    with runStatsLock:
+        stage = runStats['stages'].setdefault(pName, {'seconds': 0.0, 'calls': 0})
+        stage['seconds'] += pSeconds
+        stage['calls'] += pCalls
+
+
+
+# Measures the time spent in a block: 'with timeStage("elevation"): ...'. Stages may be nested, so their times can overlap.
+@contextlib.contextmanager
+def timeStage(pName):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        addStageTime(pName, time.perf_counter() - start)
+
+
+
+# Returns a copy of the timings and counters of the current run (e.g. to send them from a worker process to the main process).
+def getRunStats():
+    with runStatsLock:
+        return {'stages': {name: dict(stage) for name, stage in runStats['stages'].items()}, 'counters': dict(runStats['counters'])}
+
+
+
+# Adds the timings and counters of another process to the current run.
+def mergeRunStats(pStats):
+    for name, stage in pStats['stages'].items():
+        addStageTime(name, stage['seconds'], stage['calls'])
+    for name, amount in pStats['counters'].items():
+        countEvent(name, amount)
+
+
+
+# Prints the slowest stages of the current run and appends its summary as one JSON line to the summary file.
+def writeRunSummary(pFile=None, **pExtra):
+    if pFile is None:
+        pFile = config.runSummaryFile
+
+    stats = getRunStats()
+    summary = dict({
+        'name': runStats['name'],
+        'started': runStats['started'],
+        'seconds': round(time.time() - runStats['started'], 3),
+        'stages': {name: {'seconds': round(stage['seconds'], 3), 'calls': stage['calls']} for name, stage in sorted(stats['stages'].items(), key=lambda item: -item[1]['seconds'])},
+        'counters': dict(sorted(stats['counters'].items()))
+    }, **pExtra)
+
+    print(f"Done: {summary['name']} in {summary['seconds']}s - " + ", ".join(f"{name} {stage['seconds']}s" for name, stage in list(summary['stages'].items())[:5]))
+
+    if pFile is not None:
+        with open(pFile, 'a') as f:
+            f.write(json.dumps(summary) + "\n")
+
+    return summary
+
+
+
+# Prints the progress of a long loop with its rate and the estimated remaining time, at most every 'progressInterval' seconds.
+class Progress:
+    def __init__(self, pTotal, pLabel='Status', pDone=0):
+        self.total = pTotal
+        self.label = pLabel
+        self.done = pDone
+        # Work done by a previous run doesn't count for the rate.
+        self.initial = pDone
+        self.started = time.monotonic()
+        self.printed = None
+
+    def update(self, pAmount=1):
+        self.done += pAmount
+        now = time.monotonic()
+
+        # Always print the last update.
+        if self.printed is not None and now - self.printed < config.progressInterval and self.done < self.total:
+            return
+        self.printed = now
+
+        rate = (self.done - self.initial) / max(now - self.started, 1e-9)
+        eta = (self.total - self.done) / rate if rate > 0 else float('inf')
+        print(f"{self.label}: {self.done} / {self.total} ({round(self.done / self.total * 100, 3) if self.total else 100}%) - {rate:.1f}/s, ETA {formatDuration(eta)}")
+
+
+
+# Formats a number of seconds as 'h:mm:ss'.
+def formatDuration(pSeconds):
+    if not math.isfinite(pSeconds):
+        return '?'
+    minutes, seconds = divmod(int(pSeconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
+
+
+# Counts every HTTP response of the sessions: requests, bytes (as announced by the server) and retries per host.
+def countResponse(pResponse, *pArgs, **pKwargs):
+    host = urllib.parse.urlparse(pResponse.url).netloc
+    countEvent(f"requests.{host}")
+    countEvent(f"bytes.{host}", int(pResponse.headers.get('Content-Length', 0)))
+
+    if getattr(pResponse, 'from_cache', False):
+        countEvent(f"httpCache.{host}")
+
+    retries = getattr(getattr(pResponse.raw, 'retries', None), 'history', None)
+    if retries:
+        countEvent(f"retries.{host}", len(retries))
@@ -0,0 +1,350 @@
+import json
+import concurrent.futures
+import shutil
+import os
+from everland import config, elevation
+from everland.cache import getResultCacheVersion
+from everland.elevation import getElevationBackendVersion, getElevationProvider
+from everland.results import writeSweepResults
+from everland.stats import Progress, countEvent, getRunStats, mergeRunStats, startRunStats, timeStage, writeRunSummary
+from everland.temperature import lookupTemperatureChange
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+
+
+# Checks elevation and temperature data for the given coordinates and returns one record per coordinate.
+def sweepCoordinates(pLats, pLongs, pProvider):
+    # Get the elevation of all coordinates with as few requests as possible
+    with timeStage('elevation'):
+        elevations = pProvider.lookup(pLats, pLongs)
+    # Check if temperature change is within the allowed range for all coordinates
+    with timeStage('temperature'):
+        tempChangesOK, temps = lookupTemperatureChange(pLats, pLongs)
+    countEvent('coordinates', len(elevations))
+
+    records = []
+    for lat, lon, elevation, tempChangeOK, temp in zip(pLats, pLongs, elevations, tempChangesOK, temps):
+        # If the lookup failed with every provider, mark the cell as unknown instead of guessing.
+        if np.isnan(elevation):
+            row = [None, None, None, None]
+        # If elevation is 0, consider it above sea level
+        elif elevation == 0:
+            row = [True, 0.0, False, 0.0]
+        else:
+            # Check if the location is above sea level
+            row = [bool(elevation - config.seaLevelRise > 1.0), float(elevation), bool(tempChangeOK), float(temp)]
+
+        records.append(dict(zip(['latitude', 'longitude', 'aboveSea', 'elevation', 'tempChangeOK', 'percentageTempChange'], [lat.item(), lon.item()] + row)))
+
+    return records
+
+
+
+# Checks elevation and temperature data for a single latitude row and returns one record per coordinate.
+def sweepRow(pLat, pLongs, pProvider):
+    return sweepCoordinates(np.full(len(pLongs), pLat), pLongs, pProvider)
+
+
+
+# Reads the checkpoint of a sweep. Returns the finished batches and the size of the results store after the last batch.
+# Batches with failed lookups don't count as finished, so they get swept again.
+def readSweepCheckpoint(pCheckpointFile):
+    completed = set()
+    offset = 0
+
+    if os.path.exists(pCheckpointFile):
+        with open(pCheckpointFile, 'r') as f:
+            for line in f:
+                parts = line.split()
+                # Ignore a line, which was only partly written.
+                if not line.endswith("\n") or len(parts) not in (2, 3):
+                    continue
+                if len(parts) == 2:
+                    completed.add(parts[0])
+                offset = int(parts[1])
+
+    return completed, offset
+
+
+
+# Appends the records of a batch to the results store and marks the batch in the checkpoint: as done or, if a lookup
+# of the batch failed (its elevation is None), as failed. The records of a failed batch get replaced, once it's swept again.
+# Both files only get appended to, so the cost doesn't depend on the number of finished batches.
+def appendSweepBatch(pStoreFile, pCheckpointFile, pKey, pRecords):
+    with timeStage('serialize'):
+        lines = "".join(json.dumps(record) + "\n" for record in pRecords)
+
+    with timeStage('store'), open(pStoreFile, 'a') as f:
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+        offset = f.tell()
+
+    failed = any(record['elevation'] is None for record in pRecords)
+    if failed:
+        countEvent('sweep.failedBatches')
+
+    # The checkpoint gets written after the records, so a batch is only done, once its records are safe on disk.
+    with open(pCheckpointFile, 'a') as f:
+        f.write(f"{pKey} {offset} failed\n" if failed else f"{pKey} {offset}\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+
+# Reads the records of a results store (one JSON record per line). A coordinate, which was swept again (after a failed
+# lookup), keeps the record of its last sweep at the position of its first one.
+def readSweepStore(pStoreFile):
+    records = {}
+    with open(pStoreFile, 'r') as f:
+        for line in f:
+            record = json.loads(line)
+            records[(record['latitude'], record['longitude'])] = record
+
+    return list(records.values())
+
+
+
+# Converts a results store to the records format of the geojson files.
+def writeGeoJsonFromStore(pStoreFile, pFile):
+    with open(pFile, 'w') as f:
+        json.dump(readSweepStore(pStoreFile), f)
+
+
+
+# Writes the final results of a sweep from its results store: always as '.npz', as geojson only if requested.
+def writeSweepResultsFromStore(pStore, pFile, pGeoJson=False):
+    with timeStage('writeResults'):
+        records = readSweepStore(f"{pStore}.jsonl")
+        writeSweepResults(records, f"{pFile}.npz")
+
+        if pGeoJson:
+            with open(f"{pFile}.geojson", 'w') as f:
+                json.dump(records, f)
+
+
+
+# Returns the base name of the results store and checkpoint of a sweep. It contains a hash of the grid and of the settings
+# the records depend on, so a sweep only continues a previous one with the same bounds, sea level rise, temperature data
+# and elevation backend ('pProvider', None is the default backend).
+def getSweepStore(pFile, pMaxLat, pMaxLon, pSteps, pProvider=None):
+    key = getResultCacheVersion(pMaxLat, pMaxLon, pSteps, config.seaLevelRise, config.allowedDeviationPercentageOfTemp, config.temperatureDataFile, getElevationBackendVersion(pProvider))
+    return f"{pFile}.{key}"
+
+
+
+# Removes the results store, the checkpoint and the band files of a sweep, so it starts over.
+def removeSweepStore(pStore):
+    folder, name = os.path.split(pStore)
+    for file in os.listdir(folder or '.'):
+        if file.startswith(f"{name}."):
+            os.remove(os.path.join(folder, file))
+
+
+
+# Copies the settings of the main process into a worker of the parallel sweep. Only forked workers inherit changes
+# made at runtime (e.g. 'everland --sea-level-rise'), spawned ones import the defaults of the config module.
+def initSweepWorker(pSettings):
+    for name, value in pSettings.items():
+        setattr(config, name, value)
+
+    # The local api provider reads its url when it gets created, so build the default backend again with these settings.
+    elevation.localElevation = elevation.LocalElevationProvider()
+    elevation.elevationProvider = None
+
+
+
+# Sweeps the rows of a single latitude band into its own results store. Runs in a worker process of the parallel sweep.
+# 'pProvider' is a (pickled) copy of the provider of the main process, None uses the default elevation backend of the worker.
+# Returns the timings and counters of the band, so the main process can add them to its run.
+def sweepBand(pLats, pMaxLon, pSteps, pFile, pWorkers=1, pProvider=None):
+    # A forked worker starts with a copy of the main process' run.
+    startRunStats('band')
+
+    # The apis limit the request rate per client, so every worker only gets its share of every rate limit.
+    provider = pProvider if pProvider is not None else getElevationProvider()
+    provider.splitRate(pWorkers)
+
+    completed, offset = readSweepCheckpoint(f"{pFile}.checkpoint")
+    with open(f"{pFile}.jsonl", 'a') as f:
+        f.truncate(offset)
+
+    # All longitudes of a latitude row get queried together.
+    longs = np.arange(-pMaxLon, pMaxLon, pSteps)
+
+    for lat in pLats:
+        # Skip rows, which were finished by a previous run.
+        if str(lat) not in completed:
+            appendSweepBatch(f"{pFile}.jsonl", f"{pFile}.checkpoint", lat, sweepRow(lat, longs, provider))
+
+    return getRunStats()
+
+
+
+# Function to iterate through coordinates, check elevation and temperature data, and write to a file
+# The request rate is limited by the elevation provider, so there is no need to sleep between requests.
+# Every finished latitude row gets appended to a results store, so an interrupted sweep continues where it stopped.
+# Rows with failed elevation lookups get swept again by the next run.
+# 'pRestart' discards the store of a previous run with the same settings and sweeps all rows again.
+# With more than one worker, the grid gets split into latitude bands, which are swept in parallel processes.
+# The results get written to a '.npz' file, with 'pGeoJson' also to the geojson file.
+# When done, the timings and counters of the run get appended to the run summary file.
+def bruteforceCoordiantesToFile(pMaxLat, pMaxLon, pSteps, pProvider=None, pWorkers=1, pGeoJson=False, pRestart=False):
+    file = f"./geojson/bruteforcedCordinate_SeaAndTemp_Scale{pSteps}"
+    store = getSweepStore(file, pMaxLat, pMaxLon, pSteps, pProvider)
+    startRunStats('sweep')
+
+    if pRestart:
+        removeSweepStore(store)
+
+    if pWorkers > 1:
+        # Use more bands than workers, so a slow band (e.g. lots of land) doesn't keep the other workers waiting.
+        bands = [band.tolist() for band in np.array_split(np.arange(-pMaxLat, pMaxLat, pSteps), pWorkers * 4) if len(band) > 0]
+        bandFiles = [f"{store}.band{band[0]}_{band[-1]}" for band in bands]
+
+        # The settings get passed explicitly, so they also reach spawned workers.
+        settings = {name: value for name, value in vars(config).items() if not name.startswith('__')}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=pWorkers, initializer=initSweepWorker, initargs=(settings,)) as executor:
+            futures = [executor.submit(sweepBand, band, pMaxLon, pSteps, bandFile, pWorkers, pProvider) for band, bandFile in zip(bands, bandFiles)]
+            progress = Progress(len(bands), 'Bands')
+            for future in concurrent.futures.as_completed(futures):
+                mergeRunStats(future.result())
+                progress.update()
+
+        # Merge the bands (in latitude order) into the results store and take over, which rows are done and which failed.
+        with open(f"{store}.jsonl", 'w') as f:
+            for bandFile in bandFiles:
+                with open(f"{bandFile}.jsonl", 'r') as band:
+                    shutil.copyfileobj(band, f)
+            offset = f.tell()
+        completed = set().union(*(readSweepCheckpoint(f"{bandFile}.checkpoint")[0] for bandFile in bandFiles))
+        with open(f"{store}.checkpoint", 'w') as f:
+            f.write("".join(f"{lat} {offset}\n" if str(lat) in completed else f"{lat} {offset} failed\n" for band in bands for lat in band))
+
+        # Write final results to the columnar file (and the GeoJSON file)
+        writeSweepResultsFromStore(store, file, pGeoJson)
+        writeRunSummary(file=file, steps=pSteps, workers=pWorkers)
+        return
+
+    # Use the default elevation backend (with fallbacks), if no provider is given.
+    if pProvider is None:
+        pProvider = getElevationProvider()
+
+    # Continue after the last row. Records written after it (by an interrupted run) get discarded, rows which failed get swept again.
+    completed, offset = readSweepCheckpoint(f"{store}.checkpoint")
+    with open(f"{store}.jsonl", 'a') as f:
+        f.truncate(offset)
+
+    # All longitudes of a latitude row get queried together.
+    longs = np.arange(-pMaxLon, pMaxLon, pSteps)
+    lats = range(-pMaxLat, pMaxLat, pSteps)
+
+    # Count the coordinates, rows finished by a previous run are already done.
+    progress = Progress(len(lats) * len(longs), pDone=len(completed) * len(longs))
+
+    # Iterate through latitude and longitude coordinates
+    for lat in lats:  # latitude
+        # Skip rows, which were finished by a previous run.
+        if str(lat) in completed:
+            continue
+
+        # Add the row to the results store.
+        appendSweepBatch(f"{store}.jsonl", f"{store}.checkpoint", lat, sweepRow(lat, longs, pProvider))
+        progress.update(len(longs))
+
+    # Write final results to the columnar file (and the GeoJSON file)
+    writeSweepResultsFromStore(store, file, pGeoJson)
+    writeRunSummary(file=file, steps=pSteps, workers=pWorkers)
+
+
+
+# Returns the four corners of a cell, given by its south west corner and its size.
+def getCellCorners(pLat, pLong, pSize):
+    # Round the coordinates, so corners shared by neighbouring cells get the same key.
+    return [(round(lat, 6), round(lon, 6)) for lat in (pLat, pLat + pSize) for lon in (pLong, pLong + pSize)]
+
+
+
+# Samples the coordinates of a grid adaptively: it starts with cells of 'pStartSteps' degrees and only subdivides cells,
+# whose corners disagree on 'aboveSea' or 'tempChangeOK', until the cells are 'pTargetSteps' degrees small.
+# Cells get halved, so 'pStartSteps' has to be 'pTargetSteps' times a power of two.
+# Every corner gets sampled once, so children reuse the samples of their parents. Every cell gets saved with the sample of its center.
+def adaptiveCoordinatesToFile(pMaxLat, pMaxLon, pStartSteps, pTargetSteps, pProvider=None, pGeoJson=False):
+    levels = np.log2(pStartSteps / pTargetSteps)
+    if levels < 0 or not np.isclose(levels, round(levels)):
+        raise ValueError(f"The start steps ({pStartSteps}) have to be the target steps ({pTargetSteps}) times a power of two")
+
+    startRunStats('adaptiveSweep')
+
+    # Use the default elevation backend (with fallbacks), if no provider is given.
+    if pProvider is None:
+        pProvider = getElevationProvider()
+
+    # All samples so far, by their coordinates.
+    samples = {}
+    # Cells of the current level, given by their south west corner and size.
+    cells = [(float(lat), float(lon), pStartSteps) for lat in np.arange(-pMaxLat, pMaxLat, pStartSteps) for lon in np.arange(-pMaxLon, pMaxLon, pStartSteps)]
+    # Cells which don't get subdivided any further.
+    leaves = []
+    progress = Progress(int(round(levels)) + 1, 'Levels')
+
+    while len(cells) > 0:
+        # Sample all corners of this level, which weren't sampled before, in one batch.
+        corners = {corner for lat, lon, size in cells for corner in getCellCorners(lat, lon, size)}
+        missing = sorted(corner for corner in corners if corner not in samples)
+        if len(missing) > 0:
+            records = sweepCoordinates(np.array([lat for lat, _ in missing]), np.array([lon for _, lon in missing]), pProvider)
+            samples.update(zip(missing, records))
+
+        nextCells = []
+        for lat, lon, size in cells:
+            # Classify the corners. Failed lookups are a class of their own, so their cells get refined as well.
+            classes = {(samples[corner]['aboveSea'], samples[corner]['tempChangeOK']) for corner in getCellCorners(lat, lon, size)}
+
+            # Subdivide the cell, if its corners disagree and it isn't at the target resolution yet.
+            if len(classes) > 1 and not np.isclose(size, pTargetSteps):
+                half = size / 2
+                nextCells += [(lat, lon, half), (lat, lon + half, half), (lat + half, lon, half), (lat + half, lon + half, half)]
+            else:
+                leaves.append((lat, lon, size))
+
+        cells = nextCells
+        progress.update()
+
+    # Sample the centers of all leaves in one batch and save every leaf with it, together with its size.
+    centers = [(round(lat + size / 2, 6), round(lon + size / 2, 6)) for lat, lon, size in leaves]
+    missing = sorted(set(center for center in centers if center not in samples))
+    if len(missing) > 0:
+        records = sweepCoordinates(np.array([lat for lat, _ in missing]), np.array([lon for _, lon in missing]), pProvider)
+        samples.update(zip(missing, records))
+    records = [dict(samples[center], size=size) for center, (_, _, size) in zip(centers, leaves)]
+    writeSweepResults(records, f"./geojson/adaptiveCordinate_SeaAndTemp_Scale{pTargetSteps}.npz")
+    if pGeoJson:
+        with open(f"./geojson/adaptiveCordinate_SeaAndTemp_Scale{pTargetSteps}.geojson", 'w') as f:
+            json.dump(records, f)
+
+    writeRunSummary(startSteps=pStartSteps, targetSteps=pTargetSteps, cells=len(leaves), samples=len(samples))
+
+
+
+def createDummyFile(pMaxLat, pMaxLon, pSteps):
+    startRunStats('dummyFile')
+
+    # Build all latitude and longitude coordinates at once (latitude by latitude, like the sweep)
+    with timeStage('build'):
+        lats, longs = np.meshgrid(np.arange(-pMaxLat, pMaxLat, pSteps), np.arange(-pMaxLon, pMaxLon, pSteps), indexing='ij')
+
+        # Create the DataFrame with all data set to None
+        df = pd.DataFrame({'latitude': lats.ravel(), 'longitude': longs.ravel()})
+        for column in ['aboveSea', 'elevation', 'tempChangeOK', 'percentageTempChange']:
+            df[column] = None
+
+    # Write final results to a GeoJSON file
+    with timeStage('serialize'):
+        jsonData = df.to_json(orient='records')
+    with timeStage('store'), open(f"./geojson/dummy_bruteforcedCordinate_SeaAndTemp_Scale{pSteps}.geojson", 'w') as f:
+        f.write(jsonData)
+    writeRunSummary(steps=pSteps, points=len(df))
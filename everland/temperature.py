@@ -0,0 +1,101 @@
+from everland import config
+from everland.climate import getTopTenMedianAlongTime
+from everland.stats import timeStage
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+xr = LazyModule('xarray')
+
+
+
+# Temperature change for every grid cell of the NetCDF file. Gets filled by 'loadTemperatureGrid'.
+temperatureGrid = None
+
+
+
+# Opens the NetCDF file once and precomputes the temperature change for every grid cell.
+def loadTemperatureGrid(pFile=None):
+    global temperatureGrid
+
+    # Use the default data file, if no file is given.
+    if pFile is None:
+        pFile = config.temperatureDataFile
+
+    # Reuse the grid, if this file was already processed.
+    if temperatureGrid is not None and temperatureGrid['file'] == pFile:
+        return temperatureGrid
+
+    # Open the NetCDF file (only once)
+    with xr.open_dataset(pFile) as dataset:
+        # Extract the variable of interest, with time as the first axis.
+        tasmax = dataset['tasmax'].transpose('time', 'lat', 'lon')
+
+        # Select the data for the time range 1.1.2020 to 24.12.2020 and 1.1.2050 to 24.12.2050 and convert it from Kelvin to Celsius
+        temp2020 = tasmax.sel(time=slice('2020-01-01', '2020-12-24')).values.astype(float) - 273.15
+        temp2050 = tasmax.sel(time=slice('2050-01-01', '2050-12-24')).values.astype(float) - 273.15
+
+        # Save the axes of the grid.
+        lats = dataset['lat'].values.astype(float)
+        lons = dataset['lon'].values.astype(float)
+
+    # Find the median of the ten highest temperatures in 2020 and 2050 for all cells at once.
+    medianTopTen2020 = np.round(getTopTenMedianAlongTime(temp2020), 2)
+    medianTopTen2050 = np.round(getTopTenMedianAlongTime(temp2050), 2)
+
+    # Calculate the percentage change between 2020 and 2050 median temperatures
+    percentageChange = np.round((medianTopTen2050 - medianTopTen2020) / medianTopTen2020 * 100, 3)
+
+    temperatureGrid = {
+        'file': pFile,
+        'lat': lats,
+        'lon': lons,
+        'median2020': medianTopTen2020,
+        'median2050': medianTopTen2050,
+        'percentageChange': percentageChange
+    }
+
+    return temperatureGrid
+
+
+
+# Returns the index of the nearest axis value for every given value.
+def getNearestIndex(pAxis, pValues):
+    # Sort the axis, because it might be descending.
+    order = np.argsort(pAxis)
+    sortedAxis = pAxis[order]
+
+    # Find the right neighbour and check whether the left one is closer.
+    right = np.clip(np.searchsorted(sortedAxis, pValues), 1, len(sortedAxis) - 1)
+    left = right - 1
+    nearest = np.where(np.abs(pValues - sortedAxis[left]) <= np.abs(sortedAxis[right] - pValues), left, right)
+
+    return order[nearest]
+
+
+
+# Looks up the temperature change for many coordinates at once, using the precomputed grid.
+def lookupTemperatureChange(pLats, pLongs):
+    lats = np.atleast_1d(np.asarray(pLats, dtype=float))
+    longs = np.atleast_1d(np.asarray(pLongs, dtype=float))
+
+    with timeStage('netcdf'):
+        grid = loadTemperatureGrid()
+
+    # Climate models often use longitudes from 0 to 360 instead of -180 to 180.
+    if grid['lon'].max() > 180:
+        longs = np.mod(longs, 360)
+
+    # Select the data for the specific longitudes and latitudes.
+    percentageChange = grid['percentageChange'][getNearestIndex(grid['lat'], lats), getNearestIndex(grid['lon'], longs)]
+
+    # Check if the percentage change is within the allowed deviation range
+    tempChangeOK = (percentageChange > (-1)*config.allowedDeviationPercentageOfTemp) & (percentageChange < config.allowedDeviationPercentageOfTemp)
+
+    return tempChangeOK, percentageChange
+
+
+
+# Function to get temperature data for a single location from the precomputed grid
+def get_temperature_data(longitude, latitude):
+    tempChangeOK, percentageChange = lookupTemperatureChange([latitude], [longitude])
+    return bool(tempChangeOK[0]), float(percentageChange[0])
@@ -0,0 +1,169 @@
+import concurrent.futures
+import os
+import shutil
+from everland import config
+from everland.results import cellPalette, rasterizeClasses
+from everland.stats import Progress, countEvent, timeStage
+from everland.lazy import LazyModule
+
+np = LazyModule('numpy')
+branca = LazyModule('branca.utilities')
+
+
+
+# Class grid, which gets rendered by this (worker) process. Gets filled by 'initTileWorker'.
+tileGrid = None
+
+# Number of tiles a worker renders per task.
+tileBatchSize = 64
+
+
+
+# Returns the bounds (south, north, west, east) in degrees of web mercator tiles. Works on single tiles and on arrays of tiles.
+def getTileBounds(pZoom, pX, pY):
+    count = 2 ** pZoom
+    west = np.asarray(pX) / count * 360 - 180
+    east = (np.asarray(pX) + 1) / count * 360 - 180
+    north = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(pY) / count))))
+    south = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (np.asarray(pY) + 1) / count))))
+    return south, north, west, east
+
+
+
+# Renders a tile of the class grid to a RGBA image. Every pixel gets the class of the cell its center lies in.
+# The latitude only depends on the row and the longitude only on the column of a pixel, so the lookup is one outer index.
+# Returns None, if the tile has no cells.
+def renderTile(pGrid, pZoom, pX, pY, pSize=256):
+    classes = pGrid['classes']
+    south, north, west, east = pGrid['bounds']
+    pixels = 2 ** pZoom * pSize
+
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (pY * pSize + np.arange(pSize) + 0.5) / pixels))))
+    lons = (pX * pSize + np.arange(pSize) + 0.5) / pixels * 360 - 180
+    rows = np.floor((north - lats) / (north - south) * classes.shape[0]).astype(int)
+    cols = np.floor((lons - west) / (east - west) * classes.shape[1]).astype(int)
+
+    tile = classes.take(np.clip(rows, 0, classes.shape[0] - 1), axis=0).take(np.clip(cols, 0, classes.shape[1] - 1), axis=1)
+    # Pixels outside of the grid stay transparent.
+    tile[(rows < 0) | (rows >= classes.shape[0])] = 0
+    tile[:, (cols < 0) | (cols >= classes.shape[1])] = 0
+
+    if not tile.any():
+        return None
+    return np.asarray(cellPalette, dtype=np.uint8).take(tile, axis=0)
+
+
+
+# Keeps the class grid in the (worker) process, so it only gets sent once per process.
+def initTileWorker(pGrid):
+    global tileGrid
+    tileGrid = pGrid
+
+
+
+# Renders a batch of tiles and saves them as '{z}/{x}/{y}.png'. Empty tiles don't get a file (an old one gets removed).
+# Returns the number of written files.
+def writeTiles(pTiles, pFolder, pSize=256):
+    written = 0
+
+    for zoom, x, y in pTiles:
+        file = os.path.join(pFolder, str(zoom), str(x), f"{y}.png")
+        image = renderTile(tileGrid, zoom, x, y, pSize)
+
+        if image is None:
+            if os.path.exists(file):
+                os.remove(file)
+            continue
+
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file, 'wb') as f:
+            f.write(branca.write_png(image))
+        written += 1
+
+    return written
+
+
+
+# Returns the tiles (zoom, x, y) up to the given zoom, which show cells of the grid.
+# With the class grid of the previous build, only the tiles, which show a changed cell, get returned.
+def getChangedTiles(pGrid, pMaxZoom, pPrevious=None):
+    classes = pGrid['classes']
+    south, north, west, east = pGrid['bounds']
+
+    # Summed-area table of the changed cells, so the changes below a tile are four lookups.
+    changed = np.ones(classes.shape, dtype=np.int64) if pPrevious is None else (classes != pPrevious).astype(np.int64)
+    table = np.pad(changed.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+
+    tiles = []
+    for zoom in range(pMaxZoom + 1):
+        x, y = np.meshgrid(np.arange(2 ** zoom), np.arange(2 ** zoom), indexing='ij')
+        x, y = x.ravel(), y.ravel()
+        tileSouth, tileNorth, tileWest, tileEast = getTileBounds(zoom, x, y)
+
+        # Rows and columns of the grid, which the tiles cover.
+        top = np.clip(np.floor((north - tileNorth) / (north - south) * classes.shape[0]), 0, classes.shape[0]).astype(int)
+        bottom = np.clip(np.floor((north - tileSouth) / (north - south) * classes.shape[0]) + 1, 0, classes.shape[0]).astype(int)
+        left = np.clip(np.floor((tileWest - west) / (east - west) * classes.shape[1]), 0, classes.shape[1]).astype(int)
+        right = np.clip(np.floor((tileEast - west) / (east - west) * classes.shape[1]) + 1, 0, classes.shape[1]).astype(int)
+
+        count = table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+        selected = count > 0
+        tiles += [(zoom, int(tileX), int(tileY)) for tileX, tileY in zip(x[selected], y[selected])]
+
+    return tiles
+
+
+
+# Renders the classified cells of a sweep to a pyramid of PNG tiles ('{z}/{x}/{y}.png') in the given folder, for a folium/leaflet TileLayer.
+# The class grid gets kept in the folder, so the next build only renders the tiles, whose cells changed.
+# Returns the number of rendered tiles.
+def buildTilePyramid(pData, pSizes, pClasses, pFolder, pMaxZoom=None, pWorkers=None, pSize=256):
+    if pMaxZoom is None:
+        pMaxZoom = config.tileMaxZoom
+    if pWorkers is None:
+        pWorkers = config.tileWorkers if config.tileWorkers is not None else os.cpu_count()
+
+    with timeStage('rasterize'):
+        classes, bounds = rasterizeClasses(pData, pSizes, pClasses)
+    grid = {'classes': classes, 'bounds': tuple(float(bound) for bound in bounds)}
+
+    # Reuse the tiles of the previous build, if it had the same grid, zoom levels and tile size.
+    stateFile = os.path.join(pFolder, 'classes.npz')
+    previous = None
+    if os.path.exists(stateFile):
+        with np.load(stateFile) as state:
+            if state['classes'].shape == classes.shape and np.allclose(state['bounds'], grid['bounds']) and int(state['maxZoom']) == pMaxZoom and int(state['size']) == pSize:
+                previous = state['classes']
+
+    # Tiles of another grid don't fit, so start with an empty folder.
+    if previous is None and os.path.isdir(pFolder):
+        for name in os.listdir(pFolder):
+            if name.isdigit():
+                shutil.rmtree(os.path.join(pFolder, name))
+    os.makedirs(pFolder, exist_ok=True)
+
+    tiles = getChangedTiles(grid, pMaxZoom, previous)
+    batches = [tiles[start:start + tileBatchSize] for start in range(0, len(tiles), tileBatchSize)]
+    progress = Progress(len(tiles), 'Tiles')
+    written = 0
+
+    with timeStage('tiles'):
+        if pWorkers > 1 and len(batches) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=pWorkers, initializer=initTileWorker, initargs=(grid,)) as executor:
+                futures = {executor.submit(writeTiles, batch, pFolder, pSize): len(batch) for batch in batches}
+                for future in concurrent.futures.as_completed(futures):
+                    written += future.result()
+                    progress.update(futures[future])
+        else:
+            initTileWorker(grid)
+            for batch in batches:
+                written += writeTiles(batch, pFolder, pSize)
+                progress.update(len(batch))
+
+    countEvent('tiles.rendered', len(tiles))
+    countEvent('tiles.written', written)
+
+    # Save the grid only after all tiles are done, so an interrupted build gets repeated.
+    np.savez(stateFile, classes=classes, bounds=np.array(grid['bounds']), maxZoom=pMaxZoom, size=pSize)
+
+    return len(tiles)
@@ -0,0 +1,55 @@
+import pytest
+from everland import cache, config
+from everland.cache import evictResultCache, getCachedResults, putCachedResults
+
+
+
+# Clock, which advances one second per call, so every write and read has its own access time.
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        self.now += 1.0
+        return self.now
+
+
+
+# A result cache in a temporary file, with a new connection before and after the test.
+@pytest.fixture
+def resultCache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'resultCacheFile', str(tmp_path / 'results.sqlite'))
+    monkeypatch.setattr(cache, 'time', Clock())
+    cache.resultCacheLocal.pid = None
+    yield
+    cache.getResultCache().close()
+    cache.resultCacheLocal.pid = None
+
+
+
+def test_results_are_cached_per_kind_and_version(resultCache):
+    putCachedResults('elevation', [10.0, 20.0], [5.0, 5.0], 'v1', [100.0, 200.0])
+
+    assert getCachedResults('elevation', [20.0, 30.0], [5.0, 5.0], 'v1') == [200.0, None]
+    assert getCachedResults('elevation', [20.0], [5.0], 'v2') == [None]
+    assert getCachedResults('temperature', [20.0], [5.0], 'v1') == [None]
+
+
+
+def test_coordinates_get_rounded(resultCache):
+    putCachedResults('elevation', [10.00001], [5.0], 'v1', [100.0])
+
+    assert getCachedResults('elevation', [10.0], [4.99999], 'v1') == [100.0]
+
+
+
+def test_least_recently_used_results_get_evicted(resultCache, monkeypatch):
+    monkeypatch.setattr(config, 'resultCacheMaxEntries', 2)
+    for lat in [1.0, 2.0, 3.0]:
+        putCachedResults('elevation', [lat], [0.0], 'v1', [lat * 100])
+    # Reading the oldest result makes the second one the least recently used.
+    getCachedResults('elevation', [1.0], [0.0], 'v1')
+
+    evictResultCache()
+
+    assert getCachedResults('elevation', [1.0, 2.0, 3.0], [0.0, 0.0, 0.0], 'v1') == [100.0, None, 300.0]
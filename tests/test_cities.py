@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+from everland.cities import getPopulationAtRisk
+from everland.results import writeSweepResults
+
+
+
+# A 2 x 3 grid with every kind of cell the sweep writes.
+@pytest.fixture
+def sweepFile(tmp_path):
+    records = [
+        # Sea (the sweep stores elevation 0 as above sea level with a failed temperature check).
+        {'latitude': 0.0, 'longitude': 0.0, 'aboveSea': True, 'elevation': 0.0, 'tempChangeOK': False, 'percentageTempChange': 0.0},
+        {'latitude': 0.0, 'longitude': 10.0, 'aboveSea': False, 'elevation': 0.5, 'tempChangeOK': True, 'percentageTempChange': 5.0},
+        {'latitude': 0.0, 'longitude': 20.0, 'aboveSea': True, 'elevation': 300.0, 'tempChangeOK': False, 'percentageTempChange': 30.0},
+        {'latitude': 10.0, 'longitude': 0.0, 'aboveSea': True, 'elevation': 300.0, 'tempChangeOK': True, 'percentageTempChange': 5.0},
+        # Failed elevation lookup.
+        {'latitude': 10.0, 'longitude': 10.0, 'aboveSea': None, 'elevation': None, 'tempChangeOK': None, 'percentageTempChange': None},
+        {'latitude': 10.0, 'longitude': 20.0, 'aboveSea': True, 'elevation': 300.0, 'tempChangeOK': True, 'percentageTempChange': 5.0},
+    ]
+    file = str(tmp_path / 'sweep.npz')
+    writeSweepResults(records, file)
+    return file
+
+
+
+def cities(pCoordinates, pPopulation=1e6):
+    return pd.DataFrame({'name': [f"city{index}" for index in range(len(pCoordinates))], 'population': pPopulation,
+                         'latitude': [lat for lat, _ in pCoordinates], 'longitude': [lon for _, lon in pCoordinates]})
+
+
+
+def test_city_on_sea_cell_is_not_at_risk(sweepFile):
+    _, totals = getPopulationAtRisk(cities([(0.0, 0.0)]), sweepFile)
+
+    assert totals['temperaturePopulation'] == 0.0
+    assert totals['populationAtRisk'] == 0.0
+    assert totals['unknownPopulation'] == 1e6
+
+
+
+def test_population_at_risk_per_class(sweepFile):
+    _, totals = getPopulationAtRisk(cities([(0.0, 0.0), (0.0, 10.0), (0.0, 20.0), (10.0, 0.0), (10.0, 10.0), (10.0, 20.0)]), sweepFile)
+
+    assert totals == {
+        'population': 6e6,
+        'floodedPopulation': 1e6,
+        'temperaturePopulation': 1e6,
+        'populationAtRisk': 2e6,
+        'unknownPopulation': 2e6
+    }
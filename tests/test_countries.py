@@ -0,0 +1,45 @@
+import json
+import pytest
+from everland import config, countries
+from everland.countries import assignCountries, rasterizeCountries
+
+
+
+def polygon(pWest, pSouth, pEast, pNorth):
+    return [[pWest, pSouth], [pEast, pSouth], [pEast, pNorth], [pWest, pNorth], [pWest, pSouth]]
+
+
+
+# A square country with a lake (a hole) and a country of two islands.
+@pytest.fixture
+def countriesFile(tmp_path, monkeypatch):
+    features = [
+        {'type': 'Feature', 'properties': {'name': 'Square'}, 'geometry': {'type': 'Polygon', 'coordinates': [polygon(0, 0, 10, 10), polygon(4, 4, 6, 6)]}},
+        {'type': 'Feature', 'properties': {'name': 'Islands'}, 'geometry': {'type': 'MultiPolygon', 'coordinates': [[polygon(-20, -20, -18, -18)], [polygon(20, 20, 22, 22)]]}}
+    ]
+    file = tmp_path / 'countries.geojson'
+    file.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+    monkeypatch.setattr(config, 'countriesFile', str(file))
+    monkeypatch.setattr(config, 'countryGridResolution', 0.5)
+    monkeypatch.setattr(countries, 'countryGrid', None)
+    return str(file)
+
+
+
+def test_cells_get_the_country_of_their_center(countriesFile):
+    grid, names = rasterizeCountries(countriesFile, 1.0)
+
+    assert grid.shape == (180, 360)
+    assert names.tolist() == ['Square', 'Islands']
+    # Ten by ten cells, without the two by two cells of the lake.
+    assert (grid == 0).sum() == 96
+    assert (grid == 1).sum() == 8
+
+
+
+def test_coordinates_get_assigned_to_countries(countriesFile):
+    ids, names = assignCountries([2.0, 5.0, 21.0, -19.0, 40.0], [2.0, 5.0, 21.0, -19.0, 40.0])
+
+    assert ids.tolist() == [0, -1, 1, 1, -1]
+    assert names.tolist() == ['Square', None, 'Islands', 'Islands', None]
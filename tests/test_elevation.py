@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from everland import config
+from everland.elevation import DemElevationProvider, ElevationProvider, FallbackElevationProvider
+
+
+
+# Answers every location with the same elevation and remembers, which locations it was asked for.
+class FixedElevationProvider(ElevationProvider):
+    name = 'fixed'
+
+    def __init__(self, pElevation):
+        super().__init__(pRate=float('inf'))
+        self.elevation = pElevation
+        self.requested = []
+
+    def fetch(self, pLats, pLongs):
+        self.requested += list(zip(pLats, pLongs))
+        return np.full(len(pLats), self.elevation)
+
+
+
+# A single SRTM tile (lat 10 to 11, lon 10 to 11), which is 37m everywhere.
+@pytest.fixture
+def demFolder(tmp_path, monkeypatch):
+    np.full((121, 121), 37, '>i2').tofile(tmp_path / 'N10E010.hgt')
+    monkeypatch.setattr(config, 'demFolder', str(tmp_path))
+    monkeypatch.setattr(config, 'resultCacheFile', None)
+    return str(tmp_path)
+
+
+
+def test_dem_tile_answers_covered_locations(demFolder):
+    fallback = FixedElevationProvider(500.0)
+    provider = FallbackElevationProvider([DemElevationProvider(), fallback])
+
+    elevations = provider.lookup([10.5], [10.5])
+
+    assert elevations.tolist() == [37.0]
+    assert fallback.requested == []
+
+
+
+def test_locations_without_tile_fall_back(demFolder):
+    fallback = FixedElevationProvider(500.0)
+    provider = FallbackElevationProvider([DemElevationProvider(), fallback])
+
+    elevations = provider.lookup([10.5, 40.5], [10.5, 40.5])
+
+    assert elevations.tolist() == [37.0, 500.0]
+    assert fallback.requested == [(40.5, 40.5)]
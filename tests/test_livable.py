@@ -0,0 +1,103 @@
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+from everland import config, elevation, livable
+from everland.livable import runSync, sensitivityAnalysis, storeClimateMetrics
+
+
+
+# Metrics file in a temporary folder and a fake query, which counts the queried locations.
+# The elevation of a location is its latitude, the latitude 0 fails.
+@pytest.fixture
+def queried(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'climateMetricsFile', str(tmp_path / 'metrics.csv'))
+    monkeypatch.setattr(config, 'demFolder', str(tmp_path / 'dem'))
+    monkeypatch.setattr(elevation, 'elevationProvider', None)
+    locations = []
+
+    def getClimateMetrics(pLocations):
+        locations.extend(pLocations['name'])
+        return pd.DataFrame({'percentageIncreaseRain': 1.0, 'percentageIncreaseTemp': 2.0, 'percentageIncreaseWind': 3.0,
+                             'elevation': pLocations['latitude'].replace(0.0, np.nan)}, index=pLocations.index)
+
+    monkeypatch.setattr(livable, 'getClimateMetrics', getClimateMetrics)
+    return locations
+
+
+
+def locations(pLats):
+    return pd.DataFrame({'name': [f"location{lat}" for lat in pLats], 'latitude': [float(lat) for lat in pLats], 'longitude': 5.0})
+
+
+
+def test_stored_metrics_get_reused(queried):
+    storeClimateMetrics(locations([10, 20]))
+    metrics = storeClimateMetrics(locations([10, 20, 30]))
+
+    assert queried == ['location10', 'location20', 'location30']
+    assert metrics['elevation'].tolist() == [10.0, 20.0, 30.0]
+
+
+
+def test_changed_settings_query_again(queried, monkeypatch):
+    storeClimateMetrics(locations([10]))
+    monkeypatch.setattr(config, 'baselineYears', (1991, 2020))
+    storeClimateMetrics(locations([10]))
+
+    assert queried == ['location10', 'location10']
+
+
+
+def test_changed_elevation_backend_queries_again(queried, monkeypatch):
+    storeClimateMetrics(locations([10]))
+    monkeypatch.setattr(config, 'localElevationApi', 'http://localhost:1/v1/other-dataset')
+    monkeypatch.setattr(elevation, 'localElevation', elevation.LocalElevationProvider())
+    monkeypatch.setattr(elevation, 'elevationProvider', None)
+    storeClimateMetrics(locations([10]))
+
+    assert queried == ['location10', 'location10']
+
+
+
+def test_failed_lookups_are_not_stored(queried):
+    metrics = storeClimateMetrics(locations([0, 10]))
+    storeClimateMetrics(locations([0, 10]))
+
+    assert np.isnan(metrics['elevation'].iloc[0])
+    assert queried == ['location0', 'location10', 'location0']
+    assert pd.read_csv(config.climateMetricsFile)['name'].tolist() == ['location10']
+
+
+
+# Synchronous checks get called from notebooks, which already run an event loop.
+def test_run_sync_inside_running_loop():
+    async def answer():
+        return 42
+
+    async def notebook():
+        return runSync(answer())
+
+    assert runSync(answer()) == 42
+    assert asyncio.run(notebook()) == 42
+
+
+
+def test_sensitivity_counts_every_threshold_combination():
+    metrics = pd.DataFrame({
+        'percentageIncreaseRain': [5.0, -15.0, 25.0, 5.0, np.nan],
+        'percentageIncreaseTemp': [5.0, 5.0, 5.0, 15.0, 5.0],
+        'percentageIncreaseWind': [5.0, 5.0, 5.0, 5.0, 5.0],
+        'elevation': [100.0, 3.0, 100.0, 100.0, 100.0]
+    })
+    rains, temps, winds, rises = [10.0, 20.0, 30.0], [10.0, 20.0], [10.0], [0.5, 5.0]
+
+    counts = sensitivityAnalysis(metrics, rains, temps, winds, rises)
+
+    # Every combination gets the same count as checking the locations one by one.
+    for (rain, temp, wind, rise), count in counts.items():
+        livable = ((metrics['percentageIncreaseRain'].abs() <= rain) & (metrics['percentageIncreaseTemp'].abs() <= temp)
+                   & (metrics['percentageIncreaseWind'].abs() <= wind) & (metrics['elevation'] - rise > 1.0))
+        assert count == livable.sum()
+    assert len(counts) == 12
+    assert counts[(20.0, 20.0, 10.0, 0.5)] == 3
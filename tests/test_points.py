@@ -0,0 +1,49 @@
+import json
+import pytest
+from everland.points import iterGeoJsonFeatures
+
+
+
+def writeGeoJson(pFile, pFeatures):
+    with open(pFile, 'w', encoding='utf-8') as f:
+        json.dump({'type': 'FeatureCollection', 'features': pFeatures}, f)
+    return str(pFile)
+
+
+
+def point(pName, pLat, pLong, pPopulation=1000):
+    return {'type': 'Feature', 'properties': {'gis_name': pName, 'population': pPopulation}, 'geometry': {'type': 'Point', 'coordinates': [pLong, pLat]}}
+
+
+
+def test_features_get_read_in_chunks(tmp_path):
+    # A small block size, so features get split between two blocks.
+    file = writeGeoJson(tmp_path / 'points.geojson', [point(f"place{index}", index, -index) for index in range(5)])
+
+    chunks = list(iterGeoJsonFeatures(file, pChunkSize=2, pBlockSize=16))
+
+    assert [len(chunk['name']) for chunk in chunks] == [2, 2, 1]
+    assert [name for chunk in chunks for name in chunk['name']] == [f"place{index}" for index in range(5)]
+    assert chunks[1]['latitude'].tolist() == [2.0, 3.0]
+    assert chunks[1]['longitude'].tolist() == [-2.0, -3.0]
+
+
+
+def test_features_without_geometry_get_skipped(tmp_path):
+    empty = {'type': 'Feature', 'properties': {'gis_name': 'nowhere'}, 'geometry': None}
+    file = writeGeoJson(tmp_path / 'points.geojson', [point('first', 1, 1), empty, point('second', 2, 2)])
+
+    chunks = list(iterGeoJsonFeatures(file))
+
+    assert chunks[0]['name'].tolist() == ['first', 'second']
+
+
+
+# The offset is the start of the malformed feature in the file, no matter how it was split into blocks.
+@pytest.mark.parametrize('blockSize', [16, 1 << 20])
+def test_malformed_feature_raises_with_offset(tmp_path, blockSize):
+    file = tmp_path / 'points.geojson'
+    file.write_text('{"type": "FeatureCollection", "features": [{"type": "Feature"}, {"type": oops}, {"type": "Feature"}]}')
+
+    with pytest.raises(ValueError, match="character 64 "):
+        list(iterGeoJsonFeatures(str(file), pBlockSize=blockSize, pMaxFeatureSize=20))
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from everland import config, sweep
+from everland.elevation import ElevationProvider
+from everland.results import readSweepResults
+from everland.sweep import adaptiveCoordinatesToFile, appendSweepBatch, bruteforceCoordiantesToFile, getSweepStore, readSweepCheckpoint
+
+
+
+# Answers every location with 100m, except the latitudes in 'failing', whose lookups fail (NaN).
+class RowElevationProvider(ElevationProvider):
+    name = 'rows'
+
+    def __init__(self, pFailing=()):
+        super().__init__(pRate=float('inf'))
+        self.failing = set(pFailing)
+        self.requested = []
+
+    def lookup(self, pLats, pLongs):
+        self.requested += sorted(set(np.asarray(pLats).tolist()))
+        return np.array([np.nan if lat in self.failing else 100.0 for lat in pLats])
+
+
+
+# Runs the sweep in a temporary folder, without a temperature file (every temperature check passes).
+@pytest.fixture
+def sweepFolder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'geojson').mkdir()
+    monkeypatch.setattr(config, 'runSummaryFile', None)
+    monkeypatch.setattr(sweep, 'lookupTemperatureChange', lambda pLats, pLongs: (np.full(len(pLats), True), np.zeros(len(pLats))))
+    return tmp_path
+
+
+
+def test_checkpoint_skips_failed_and_partly_written_batches(tmp_path):
+    store, checkpoint = str(tmp_path / 'store.jsonl'), str(tmp_path / 'store.checkpoint')
+    appendSweepBatch(store, checkpoint, 1, [{'latitude': 1, 'longitude': 0, 'elevation': 10.0}])
+    appendSweepBatch(store, checkpoint, 2, [{'latitude': 2, 'longitude': 0, 'elevation': None}])
+    offset = tmp_path.joinpath('store.jsonl').stat().st_size
+    with open(checkpoint, 'a') as f:
+        f.write("3 12")
+
+    assert readSweepCheckpoint(checkpoint) == ({'1'}, offset)
+
+
+
+def test_resumed_sweep_only_repeats_failed_rows(sweepFolder):
+    first = RowElevationProvider(pFailing=[0])
+    bruteforceCoordiantesToFile(2, 2, 1, pProvider=first)
+    # Same name and dataset, so the second run continues the store of the first one.
+    second = RowElevationProvider()
+    bruteforceCoordiantesToFile(2, 2, 1, pProvider=second)
+
+    data = readSweepResults('geojson/bruteforcedCordinate_SeaAndTemp_Scale1.npz')
+
+    assert first.requested == [-2.0, -1.0, 0.0, 1.0]
+    assert second.requested == [0.0]
+    assert data['elevation'].size == 16
+    assert not np.isnan(data['elevation']).any()
+
+
+
+def test_store_depends_on_elevation_backend(sweepFolder, monkeypatch):
+    store = getSweepStore('sweep', 2, 2, 1)
+    monkeypatch.setattr(config, 'localElevationApi', 'http://localhost:1/v1/other-dataset')
+    monkeypatch.setattr(sweep.elevation, 'localElevation', sweep.elevation.LocalElevationProvider())
+    monkeypatch.setattr(sweep.elevation, 'elevationProvider', None)
+
+    assert getSweepStore('sweep', 2, 2, 1) != store
+
+
+
+# The coast runs along the longitude 1.3, the land is east of it.
+class CoastElevationProvider(ElevationProvider):
+    name = 'coast'
+
+    def lookup(self, pLats, pLongs):
+        return np.where(np.asarray(pLongs) > 1.3, 100.0, 0.5)
+
+
+
+def test_adaptive_cells_get_the_sample_of_their_center(sweepFolder):
+    adaptiveCoordinatesToFile(8, 8, 4, 1, pProvider=CoastElevationProvider())
+
+    data = readSweepResults('geojson/adaptiveCordinate_SeaAndTemp_Scale1.npz')
+
+    assert data['size'].min() == 1.0
+    assert (data['elevation'] == np.where(data['longitude'] > 1.3, 100.0, 0.5)).all()
+
+
+
+def test_adaptive_target_has_to_be_reachable_by_halving(sweepFolder):
+    with pytest.raises(ValueError):
+        adaptiveCoordinatesToFile(8, 8, 3, 1, pProvider=CoastElevationProvider())